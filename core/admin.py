@@ -1,6 +1,11 @@
 from django.contrib import admin
-from core.models import Wallet, Token, WalletToken
+from core.models import Wallet, Token, WalletToken, TokenCategoryCache
 from core.models.alchemy_event import AlchemyEvent
+from core.models.wallet_sync import PendingWalletSync
+from core.models.portfolio_drift import PortfolioDrift
+from core.models.rate_limit import RateLimitBucket
+from core.models.coingecko_miss import CoinGeckoMiss
+from core.models.social_post import SocialPost
 
 
 class WalletTokenInline(admin.TabularInline):
@@ -25,15 +30,114 @@ class WalletAdmin(admin.ModelAdmin):
 
 @admin.register(Token)
 class TokenAdmin(admin.ModelAdmin):
-    list_display = ("symbol", "name", "chain_id", "address", "category")
-    list_filter = ("chain_id", "category")
+    list_display = ("symbol", "name", "chain_id", "address", "category", "is_spam")
+    list_filter = ("chain_id", "category", "is_spam")
     search_fields = ("symbol", "name", "address")
     readonly_fields = ("created_at", "updated_at")
+    actions = ["mark_as_spam", "unmark_as_spam"]
+
+    @admin.action(description="Mark selected tokens as spam")
+    def mark_as_spam(self, request, queryset):
+        queryset.update(is_spam=True)
+
+    @admin.action(description="Unmark selected tokens as spam")
+    def unmark_as_spam(self, request, queryset):
+        queryset.update(is_spam=False)
 
 
 @admin.register(AlchemyEvent)
 class AlchemyEventAdmin(admin.ModelAdmin):
-    list_display = ('event_id', 'processed', 'created_at')
+    list_display = (
+        'event_id', 'processed', 'failed', 'attempts', 'created_at', 'processed_at'
+    )
+    list_filter = ('processed', 'failed')
     search_fields = ('event_id',)
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'processed_at')
     ordering = ('-created_at',)
+    actions = ['retry']
+
+    @admin.action(description='Retry selected events')
+    def retry(self, request, queryset):
+        count = AlchemyEvent.retry(queryset)
+        self.message_user(request, '{} events queued again'.format(count))
+
+
+@admin.register(PendingWalletSync)
+class PendingWalletSyncAdmin(admin.ModelAdmin):
+    list_display = (
+        "wallet",
+        "first_event_at",
+        "due_at",
+        "attempts",
+        "failed",
+        "locked_until",
+    )
+    list_filter = ("failed",)
+    readonly_fields = ("first_event_at",)
+    ordering = ("due_at",)
+    actions = ["retry"]
+
+    @admin.action(description="Retry selected windows")
+    def retry(self, request, queryset):
+        count = PendingWalletSync.retry(queryset)
+        self.message_user(request, "{} windows queued again".format(count))
+
+
+@admin.register(TokenCategoryCache)
+class TokenCategoryCacheAdmin(admin.ModelAdmin):
+    list_display = ("coingecko_id", "category", "created_at")
+    list_filter = ("category",)
+    search_fields = ("coingecko_id",)
+
+
+@admin.register(PortfolioDrift)
+class PortfolioDriftAdmin(admin.ModelAdmin):
+    list_display = ("wallet", "max_deviation", "total_value_usd", "scanned_at")
+    search_fields = ("wallet__address",)
+    readonly_fields = ("scanned_at",)
+    ordering = ("-max_deviation",)
+
+
+@admin.register(RateLimitBucket)
+class RateLimitBucketAdmin(admin.ModelAdmin):
+    list_display = ("provider", "tokens", "updated_at", "blocked_until")
+
+
+@admin.register(CoinGeckoMiss)
+class CoinGeckoMissAdmin(admin.ModelAdmin):
+    list_display = (
+        "address",
+        "coingecko_chain_id",
+        "miss_count",
+        "first_missed_at",
+        "checked_at",
+    )
+    list_filter = ("coingecko_chain_id",)
+    search_fields = ("address",)
+    readonly_fields = ("first_missed_at",)
+    ordering = ("-miss_count",)
+    actions = ["recheck"]
+
+    @admin.action(description="Re-check selected contracts on CoinGecko")
+    def recheck(self, request, queryset):
+        found, still_missing = CoinGeckoMiss.recheck(queryset)
+        self.message_user(
+            request,
+            "{} contracts now listed, {} still missing".format(found, still_missing),
+        )
+
+
+@admin.register(SocialPost)
+class SocialPostAdmin(admin.ModelAdmin):
+    list_display = ("id", "platform", "wallet", "status", "attempts", "created_at")
+    list_filter = ("platform", "status")
+    search_fields = ("text", "wallet__address")
+    readonly_fields = ("created_at", "sent_at", "external_id")
+    actions = ["retry"]
+
+    @admin.action(description="Retry selected posts")
+    def retry(self, request, queryset):
+        count = queryset.exclude(status="sent").update(
+            status="pending", attempts=0, locked_until=None
+        )
+        self.message_user(request, "{} posts queued again".format(count))
@@ -0,0 +1,131 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.core.management.base import BaseCommand
+
+from core.models import SocialPost
+from core.services import rate_limit
+from core.services.social import get_farcaster_client, get_twitter_client, post_message
+
+PLATFORM_CLIENTS = {
+    "farcaster": get_farcaster_client,
+    "twitter": get_twitter_client,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Posts the queued SocialPost messages, each platform within its "
+        "FARCASTER/TWITTER_RATE_LIMIT_PER_MINUTE"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--platform",
+            action="append",
+            choices=list(PLATFORM_CLIENTS),
+            help="Only dispatch this platform (repeatable; all by default)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=config("SOCIAL_POST_CONCURRENCY", default=2, cast=int),
+            help="Posts in flight per platform",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=config("SOCIAL_POST_POLL_INTERVAL", default=2.0, cast=float),
+            help="Seconds to wait between polls when the outbox is empty",
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            default=config("SOCIAL_POST_LEASE_SECONDS", default=600, cast=int),
+            help="Seconds a claimed post stays locked before another dispatcher may retry it",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=config("SOCIAL_POST_MAX_ATTEMPTS", default=5, cast=int),
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=config("SOCIAL_POST_RETRY_DELAY_SECONDS", default=30, cast=int),
+            help="Delay before the first retry, doubled on each attempt",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the outbox once and exit",
+        )
+
+    def handle(self, *args, **options):
+        platforms = []
+        for platform in options["platform"] or list(PLATFORM_CLIENTS):
+            if PLATFORM_CLIENTS[platform]() is None:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "{} is not configured, skipping its posts".format(platform)
+                    )
+                )
+            else:
+                platforms.append(platform)
+        if not platforms:
+            return
+
+        self.stdout.write(
+            "Dispatching {} posts with concurrency {}".format(
+                ", ".join(platforms), options["concurrency"]
+            )
+        )
+        asyncio.run(self._dispatch(platforms, options))
+
+    async def _dispatch(self, platforms, options):
+        await asyncio.gather(
+            *[
+                self._drain(platform, options)
+                for platform in platforms
+                for _ in range(options["concurrency"])
+            ]
+        )
+
+    async def _drain(self, platform, options):
+        """
+        Claims and posts one message at a time, so a claimed post never waits
+        on the rate limiter for longer than `concurrency` posts
+        """
+        while True:
+            posts = await sync_to_async(SocialPost.claim_pending)(
+                platform, limit=1, lease_seconds=options["lease"]
+            )
+            if not posts:
+                if options["once"]:
+                    return
+                await asyncio.sleep(options["poll_interval"])
+                continue
+            await self._send(posts[0], options)
+
+    async def _send(self, post, options):
+        await rate_limit.aacquire(post.platform)
+        try:
+            external_id = await sync_to_async(post_message, thread_sensitive=False)(
+                post.platform, post.text
+            )
+        except Exception as e:
+            delay = min(options["retry_delay"] * 2 ** (post.attempts - 1), 60 * 60)
+            print(
+                "Error posting SocialPost {} to {} (attempt {}): {}".format(
+                    post.pk, post.platform, post.attempts, e
+                )
+            )
+            response = getattr(e, "response", None)
+            if getattr(response, "status_code", None) == 429:
+                await rate_limit.apenalize(post.platform, delay)
+            await sync_to_async(post.mark_failed)(e, delay, options["max_attempts"])
+            return
+
+        await sync_to_async(post.mark_sent)(external_id)
+        print("SocialPost {} posted to {}".format(post.pk, post.platform))
@@ -0,0 +1,164 @@
+from itertools import islice
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import PortfolioDrift, Token, Wallet, WalletToken
+from core.models.wallet import NATIVE_TOKEN_ADDRESS
+from core.services import portfolio
+from core.services.prices import get_token_prices
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Revalues every wallet with fresh prices and stores its deviation from "
+        "the target portfolio in PortfolioDrift. Meant to be scheduled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched per round trip of the server-side cursors",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Wallets analyzed and written per batch",
+        )
+        parser.add_argument(
+            "--price-batch-size",
+            type=int,
+            default=1000,
+            help="Tokens priced per `get_token_prices` call",
+        )
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+        prices = self._refresh_prices(
+            options["chunk_size"], options["price_batch_size"]
+        )
+        self.stdout.write("Priced {} held tokens".format(len(prices)))
+
+        wallets = (
+            Wallet.objects.order_by("pk")
+            .values_list("pk", "portfolio")
+            .iterator(chunk_size=options["chunk_size"])
+        )
+        scanned = 0
+        for batch in _batches(wallets, options["batch_size"]):
+            drifts = self._scan_batch(batch, prices, options["chunk_size"], started_at)
+            PortfolioDrift.objects.bulk_create(
+                drifts,
+                update_conflicts=True,
+                unique_fields=["wallet"],
+                update_fields=[
+                    "max_deviation",
+                    "total_value_usd",
+                    "distribution",
+                    "deviations",
+                    "scanned_at",
+                ],
+            )
+            scanned += len(drifts)
+
+        # Wallets that no longer hold anything
+        PortfolioDrift.objects.filter(scanned_at__lt=started_at).delete()
+
+        self.stdout.write(self.style.SUCCESS("Scanned {} wallets".format(scanned)))
+
+    def _refresh_prices(self, chunk_size, price_batch_size):
+        """
+        Prices the distinct set of held tokens once, whatever the number of
+        wallets holding them. Returns {token_id: usd}.
+        """
+        held_tokens = (
+            Token.objects.filter(wallettoken__balance__gt=0)
+            .distinct()
+            .values_list("pk", "address", "coingecko_chain_id", "coingecko_id")
+            .iterator(chunk_size=chunk_size)
+        )
+        prices = {}
+        for batch in _batches(held_tokens, price_batch_size):
+            token_keys = {}
+            coin_ids = {}
+            for pk, address, network, coingecko_id in batch:
+                if address == NATIVE_TOKEN_ADDRESS:
+                    coin_ids[pk] = coingecko_id or "ethereum"
+                elif network:
+                    token_keys[pk] = (network, address)
+
+            try:
+                token_prices, coin_prices = get_token_prices(
+                    token_keys.values(), coin_ids.values()
+                )
+            except Exception as e:
+                print("Error getting token prices: {}".format(e))
+                continue
+            for pk, key in token_keys.items():
+                if key in token_prices:
+                    prices[pk] = token_prices[key]
+            for pk, coin_id in coin_ids.items():
+                if coin_id in coin_prices:
+                    prices[pk] = coin_prices[coin_id]
+        return prices
+
+    def _scan_batch(self, wallets, prices, chunk_size, scanned_at):
+        positions = (
+            WalletToken.objects.filter(
+                wallet_id__in=[pk for pk, _ in wallets], balance__gt=0
+            )
+            .values_list(
+                "wallet_id", "token_id", "token__category", "balance", "balance_usd"
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+
+        # Revalue with the fresh price, or keep the stored value when unpriced
+        values = portfolio.fleet_category_values(
+            (
+                (
+                    wallet_id,
+                    category,
+                    balance * prices[token_id] if token_id in prices else balance_usd,
+                )
+                for wallet_id, token_id, category, balance, balance_usd in positions
+            ),
+            [pk for pk, _ in wallets],
+        )
+        totals = values.sum(axis=1)
+        distributions = portfolio.distributions(values)
+        deviations = portfolio.deviations(
+            distributions, portfolio.target_matrix([target for _, target in wallets])
+        )
+        max_deviations = np.abs(deviations).max(axis=1)
+
+        drifts = []
+        for row in np.flatnonzero(totals > 0):
+            drifts.append(
+                PortfolioDrift(
+                    wallet_id=wallets[row][0],
+                    max_deviation=round(float(max_deviations[row]), 2),
+                    total_value_usd=round(float(totals[row]), 2),
+                    distribution=dict(
+                        zip(
+                            portfolio.CATEGORIES,
+                            np.round(distributions[row], 2).tolist(),
+                        )
+                    ),
+                    deviations=dict(
+                        zip(portfolio.CATEGORIES, np.round(deviations[row], 2).tolist())
+                    ),
+                    scanned_at=scanned_at,
+                )
+            )
+        return drifts
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from core.services.generation import (
+    censored_histogram,
+    latency_histogram,
+    latency_percentile,
+    outcome_counts,
+)
+
+
+def _seconds(value):
+    if value is None:
+        return "n/a"
+    if value == float("inf"):
+        return "inf"
+    return "{}s".format(value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints the latency histogram and outcomes of each message generation "
+        "backend, to tune MESSAGE_HEDGE_DELAY_SECONDS (e.g. to the primary's p95)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "backends", nargs="*", default=["autonome", "openai"], help="Backend names"
+        )
+
+    def handle(self, *args, **options):
+        for backend in options["backends"]:
+            self.stdout.write(self.style.MIGRATE_HEADING(backend))
+            self.stdout.write(
+                "  outcomes: {}".format(
+                    ", ".join(
+                        "{}={}".format(outcome, count)
+                        for outcome, count in outcome_counts(backend).items()
+                    )
+                )
+            )
+            censored = censored_histogram(backend)
+            for bound, count in latency_histogram(backend).items():
+                self.stdout.write(
+                    "  <= {:>6}: {} (unanswered: {})".format(
+                        _seconds(bound), count, censored[bound]
+                    )
+                )
+            self.stdout.write(
+                "  p50: {}, p95: {}".format(
+                    _seconds(latency_percentile(backend, 50)),
+                    _seconds(latency_percentile(backend, 95)),
+                )
+            )
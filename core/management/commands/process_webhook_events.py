@@ -0,0 +1,146 @@
+import asyncio
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from decouple import config
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from core.models import AlchemyEvent, PendingWalletSync
+from core.pipeline import process_event, process_wallet_sync
+from core.services.http import closing_clients
+
+
+def _mark_failed(model, pk, error, retry_delay, max_attempts):
+    obj = model.objects.filter(pk=pk).first()
+    if obj is not None:
+        obj.mark_failed(error, retry_delay * obj.attempts, max_attempts)
+
+
+async def _run_job(model, handler, pk, retry_delay, max_attempts):
+    # Each job gets its own thread for its database work, so jobs do not queue
+    # behind each other's blocking calls
+    async with ThreadSensitiveContext():
+        try:
+            status = await handler(pk)
+            print("{} {} finished: {}".format(model.__name__, pk, status))
+        except Exception as e:
+            print("Error processing {} {}: {}".format(model.__name__, pk, e))
+            await sync_to_async(_mark_failed)(model, pk, e, retry_delay, max_attempts)
+        finally:
+            # The job's thread goes away with the context
+            await sync_to_async(connections.close_all)()
+
+
+def _claim(claim, limit, options):
+    pks = claim(
+        limit=limit,
+        lease_seconds=options["lease"],
+        max_attempts=options["max_attempts"],
+    )
+    close_old_connections()
+    return pks
+
+
+class Command(BaseCommand):
+    help = (
+        "Claims queued Alchemy webhook events and closed wallet sync windows "
+        "and runs the processing pipeline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=config("WEBHOOK_WORKER_CONCURRENCY", default=4, cast=int),
+            help="Number of events processed at the same time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=config("WEBHOOK_WORKER_POLL_INTERVAL", default=1.0, cast=float),
+            help="Seconds to wait between polls when the queue is empty",
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            default=config("WEBHOOK_WORKER_LEASE_SECONDS", default=300, cast=int),
+            help="Seconds a claimed event stays locked before another worker may retry it",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=config("WEBHOOK_WORKER_MAX_ATTEMPTS", default=5, cast=int),
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=config("WEBHOOK_WORKER_RETRY_DELAY_SECONDS", default=30, cast=int),
+            help="Base delay before a failed event is retried (multiplied by attempts)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help=(
+                "Drain the queue once and exit, after waiting for the open wallet "
+                "sync windows to close"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            "Starting webhook worker with concurrency {}".format(options["concurrency"])
+        )
+        # One event loop for the lifetime of the worker: every job, and every
+        # `async_to_sync` call made by their blocking code, shares its HTTP clients
+        asyncio.run(closing_clients(self._work)(options))
+
+    async def _work(self, options):
+        concurrency = options["concurrency"]
+        poll_interval = options["poll_interval"]
+
+        in_flight = set()
+        while True:
+            for model, handler, claim in (
+                (AlchemyEvent, process_event, AlchemyEvent.claim_pending),
+                (
+                    PendingWalletSync,
+                    process_wallet_sync,
+                    PendingWalletSync.claim_due,
+                ),
+            ):
+                free_slots = concurrency - len(in_flight)
+                if free_slots <= 0:
+                    break
+                pks = await sync_to_async(_claim)(claim, free_slots, options)
+                for pk in pks:
+                    in_flight.add(
+                        asyncio.create_task(
+                            _run_job(
+                                model,
+                                handler,
+                                pk,
+                                options["retry_delay"],
+                                options["max_attempts"],
+                            )
+                        )
+                    )
+
+            if not in_flight:
+                if options["once"]:
+                    # Open windows still belong to this drain
+                    due_at = await sync_to_async(PendingWalletSync.next_due_at)()
+                    if due_at is None:
+                        break
+                    await asyncio.sleep(
+                        max((due_at - timezone.now()).total_seconds(), 0)
+                    )
+                    continue
+                await asyncio.sleep(poll_interval)
+                continue
+
+            _, in_flight = await asyncio.wait(
+                in_flight,
+                timeout=None if len(in_flight) >= concurrency else poll_interval,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
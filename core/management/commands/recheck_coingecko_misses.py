@@ -0,0 +1,54 @@
+import asyncio
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from core.models import CoinGeckoMiss
+from core.services.http import closing_clients
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-checks on CoinGecko the contracts it answered 404 for, once their "
+        "entry is older than COINGECKO_MISS_TTL_SECONDS. Meant to be scheduled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Also re-check entries younger than the TTL",
+        )
+        parser.add_argument("--limit", type=int, default=None)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Contracts looked up concurrently per batch",
+        )
+
+    def handle(self, *args, **options):
+        # The batches share one event loop, and so its HTTP clients
+        asyncio.run(closing_clients(sync_to_async(self._recheck))(options))
+
+    def _recheck(self, options):
+        misses = (
+            CoinGeckoMiss.objects.all() if options["all"] else CoinGeckoMiss.expired()
+        )
+        misses = misses.order_by("checked_at")
+        if options["limit"]:
+            misses = misses[: options["limit"]]
+
+        iterator = misses.iterator(chunk_size=options["batch_size"])
+        found = still_missing = 0
+        while batch := list(islice(iterator, options["batch_size"])):
+            batch_found, batch_missing = CoinGeckoMiss.recheck(batch)
+            found += batch_found
+            still_missing += batch_missing
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "{} contracts now listed, {} still missing".format(found, still_missing)
+            )
+        )
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Wallet
+from core.services.http import closing_clients
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a full sync for wallets whose last full sync is older than "
+        "--stale-after seconds. Meant to be scheduled (e.g. Heroku Scheduler)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=config(
+                "WALLET_FULL_SYNC_INTERVAL_SECONDS", default=6 * 60 * 60, cast=int
+            ),
+        )
+        parser.add_argument("--limit", type=int, default=None)
+
+    def handle(self, *args, **options):
+        # The syncs share one event loop, and so its HTTP clients
+        asyncio.run(closing_clients(sync_to_async(self._sync_wallets))(options))
+
+    def _sync_wallets(self, options):
+        threshold = timezone.now() - timedelta(seconds=options["stale_after"])
+        wallets = Wallet.objects.filter(
+            Q(last_full_sync_at__isnull=True) | Q(last_full_sync_at__lt=threshold)
+        ).order_by("last_full_sync_at")
+        if options["limit"]:
+            wallets = wallets[: options["limit"]]
+
+        count = 0
+        for wallet in wallets.iterator():
+            self.stdout.write("Syncing wallet {}...".format(wallet.address))
+            wallet.sync_wallet()
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS("Synced {} wallets".format(count)))
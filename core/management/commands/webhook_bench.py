@@ -0,0 +1,334 @@
+import asyncio
+import copy
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from collections import Counter
+
+import httpx
+from decouple import config
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import AlchemyEvent, PendingWalletSync
+from core.services.bench import STUB_PROVIDERS, StubUpstreams, percentiles
+from core.utils import normalize_address
+
+
+def _provider_values(specs, option):
+    """
+    Parses `--stub-latency 0.1 --stub-latency openai=2` style options into
+    {"default": 0.1, "openai": 2.0}
+    """
+    values = {}
+    for spec in specs or []:
+        provider, _, value = spec.rpartition("=")
+        provider = provider or "default"
+        if provider != "default" and provider not in STUB_PROVIDERS:
+            raise CommandError("Unknown provider `{}` in {}".format(provider, option))
+        values[provider] = float(value)
+    return values
+
+
+def _ms(seconds):
+    return "n/a" if seconds is None else "{:.1f}ms".format(seconds * 1000)
+
+
+class Command(BaseCommand):
+    help = (
+        "Signs recorded or synthetic Alchemy payloads with "
+        "ALCHEMY_WEBHOOK_SIGNING_KEY, fires them at the webhook at a given rate "
+        "and concurrency and reports throughput, latency percentiles and errors. "
+        "With --serve-stubs, local stand-ins replace the upstream APIs; start "
+        "the web server and worker with the printed variables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000"
+            + config("ALCHEMY_WEBHOOK_PATH", default="/api/v1/webhook/"),
+            help="Webhook URL",
+        )
+        parser.add_argument(
+            "--payload",
+            action="append",
+            help="Recorded payload file (repeatable; the bundled samples by default)",
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Requests per second (0 sends as fast as --concurrency allows)",
+        )
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument(
+            "--wallet",
+            action="append",
+            help="Tracked wallet the transfers are sent to (repeatable, round-robin)",
+        )
+        parser.add_argument(
+            "--replay",
+            action="store_true",
+            help="Keep the recorded event ids and hashes (exercises deduplication)",
+        )
+        parser.add_argument(
+            "--wait",
+            type=float,
+            default=0,
+            help="Seconds to wait for the worker to process the events and report "
+            "the processing latency (needs the same database as the worker)",
+        )
+        parser.add_argument(
+            "--serve-stubs",
+            action="store_true",
+            help="Serve stand-ins for the upstream APIs during the run",
+        )
+        parser.add_argument(
+            "--stubs-only",
+            action="store_true",
+            help="Serve the stand-ins until interrupted, without sending requests",
+        )
+        parser.add_argument("--stub-host", default="127.0.0.1")
+        parser.add_argument("--stub-port", type=int, default=8765)
+        parser.add_argument(
+            "--stub-latency",
+            action="append",
+            help="Mean stand-in latency in seconds, optionally per provider "
+            "(e.g. 0.05 or openai=2)",
+        )
+        parser.add_argument(
+            "--stub-error-rate",
+            action="append",
+            help="Share of stand-in 503 answers, optionally per provider "
+            "(e.g. 0.01 or coingecko=0.2)",
+        )
+        parser.add_argument(
+            "--stub-tokens",
+            type=int,
+            default=5,
+            help="Tokens held by every wallet according to the stand-ins",
+        )
+
+    def handle(self, *args, **options):
+        stubs = None
+        if options["serve_stubs"] or options["stubs_only"]:
+            stubs = StubUpstreams(
+                host=options["stub_host"],
+                port=options["stub_port"],
+                latency=_provider_values(options["stub_latency"], "--stub-latency"),
+                error_rate=_provider_values(
+                    options["stub_error_rate"], "--stub-error-rate"
+                ),
+                tokens=options["stub_tokens"],
+            ).start()
+            self.stdout.write("Stand-ins listening on {}".format(stubs.url))
+            self.stdout.write("Run the web server and worker with:")
+            for name, value in stubs.environ().items():
+                self.stdout.write("  export {}='{}'".format(name, value))
+
+        try:
+            if options["stubs_only"]:
+                self.stdout.write("Press Ctrl-C to stop")
+                while True:
+                    time.sleep(3600)
+            self._bench(options)
+            if stubs is not None:
+                self.stdout.write(
+                    "Stand-in requests: {}".format(
+                        ", ".join(
+                            "{}={}".format(provider, count)
+                            for provider, count in stubs.requests.items()
+                        )
+                    )
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if stubs is not None:
+                stubs.stop()
+
+    def _bench(self, options):
+        templates = []
+        for path in options["payload"] or [
+            settings.BASE_DIR / "payload-alchemy-sample.json",
+            settings.BASE_DIR / "payload-alchemy-uniswap-usd-to-eth.json",
+        ]:
+            with open(path) as f:
+                templates.append(json.load(f))
+
+        run_id = uuid.uuid4().hex[:8]
+        wallets = [normalize_address(wallet) for wallet in options["wallet"] or []]
+        bodies = [
+            self._body(templates[n % len(templates)], n, run_id, wallets, options)
+            for n in range(options["requests"])
+        ]
+        signing_key = bytes(config("ALCHEMY_WEBHOOK_SIGNING_KEY"), "utf-8")
+        requests = [
+            (
+                body,
+                hmac.new(signing_key, msg=body, digestmod=hashlib.sha256).hexdigest(),
+            )
+            for body in bodies
+        ]
+
+        self.stdout.write(
+            "Sending {} requests to {} (concurrency {}, rate {})...".format(
+                len(requests),
+                options["url"],
+                options["concurrency"],
+                options["rate"] or "unbounded",
+            )
+        )
+        results, duration = asyncio.run(self._fire(requests, options))
+        self._report(results, duration)
+
+        if options["wait"] and not options["replay"]:
+            self._report_processing(run_id, wallets, options["wait"])
+
+    def _body(self, template, n, run_id, wallets, options):
+        payload = copy.deepcopy(template)
+        if not options["replay"]:
+            payload["id"] = "whevt_bench_{}_{}".format(run_id, n)
+        for i, activity in enumerate(payload.get("event", {}).get("activity") or []):
+            if not options["replay"]:
+                activity["hash"] = (
+                    "0x"
+                    + hashlib.sha256(
+                        "{}:{}:{}".format(run_id, n, i).encode()
+                    ).hexdigest()
+                )
+            if wallets:
+                activity["toAddress"] = wallets[n % len(wallets)]
+        return json.dumps(payload).encode()
+
+    async def _fire(self, requests, options):
+        """
+        Sends the signed requests and returns ([(outcome, latency)], duration).
+        With a --rate, latency is measured from the scheduled send time, so
+        time spent waiting for a free connection counts.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        limits = httpx.Limits(
+            max_connections=options["concurrency"],
+            max_keepalive_connections=options["concurrency"],
+        )
+        results = []
+
+        async with httpx.AsyncClient(
+            timeout=options["timeout"], limits=limits
+        ) as client:
+            started_at = loop.time()
+
+            async def send(n, body, signature):
+                scheduled_at = loop.time()
+                if options["rate"]:
+                    scheduled_at = started_at + n / options["rate"]
+                    await asyncio.sleep(max(scheduled_at - loop.time(), 0))
+                async with semaphore:
+                    if not options["rate"]:
+                        scheduled_at = loop.time()
+                    try:
+                        response = await client.post(
+                            options["url"],
+                            content=body,
+                            headers={
+                                "content-type": "application/json",
+                                "x-alchemy-signature": signature,
+                            },
+                        )
+                        outcome = response.status_code
+                    except httpx.HTTPError as e:
+                        outcome = type(e).__name__
+                results.append((outcome, loop.time() - scheduled_at))
+
+            await asyncio.gather(
+                *[
+                    send(n, body, signature)
+                    for n, (body, signature) in enumerate(requests)
+                ]
+            )
+            duration = loop.time() - started_at
+        return results, duration
+
+    def _report(self, results, duration):
+        outcomes = Counter(outcome for outcome, _ in results)
+        latencies = [latency for outcome, latency in results if outcome == 200]
+        points = percentiles(latencies)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Webhook"))
+        self.stdout.write(
+            "  {} requests in {:.2f}s: {:.1f} req/s".format(
+                len(results), duration, len(results) / duration if duration else 0
+            )
+        )
+        self.stdout.write(
+            "  latency (200s): p50 {}, p95 {}, p99 {}, max {}".format(
+                _ms(points[50]),
+                _ms(points[95]),
+                _ms(points[99]),
+                _ms(max(latencies) if latencies else None),
+            )
+        )
+        self.stdout.write(
+            "  outcomes: {}".format(
+                ", ".join(
+                    "{}={}".format(outcome, count)
+                    for outcome, count in sorted(outcomes.items(), key=str)
+                )
+            )
+        )
+        errors = sum(count for outcome, count in outcomes.items() if outcome != 200)
+        style = self.style.SUCCESS if errors == 0 else self.style.WARNING
+        self.stdout.write(style("  errors: {}".format(errors)))
+
+    def _report_processing(self, run_id, wallets, timeout):
+        """
+        Waits for the worker to process the run's events (and close the wallet
+        sync windows, with --wallet) and reports how long it took
+        """
+        events = AlchemyEvent.objects.filter(
+            event_id__startswith="whevt_bench_{}_".format(run_id)
+        )
+        pending_syncs = PendingWalletSync.objects.filter(wallet__address__in=wallets)
+        started_at = time.monotonic()
+        while time.monotonic() - started_at < timeout:
+            if not events.filter(processed=False, failed=False).exists() and not (
+                wallets and pending_syncs.filter(failed=False).exists()
+            ):
+                break
+            time.sleep(0.5)
+        drained_after = time.monotonic() - started_at
+
+        processed = list(
+            events.filter(processed=True).values_list("created_at", "processed_at")
+        )
+        points = percentiles(
+            [
+                (processed_at - created_at).total_seconds()
+                for created_at, processed_at in processed
+            ]
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING("Worker"))
+        self.stdout.write(
+            "  {}/{} events processed, queue drained {:.1f}s after the last request{}".format(
+                len(processed),
+                events.count(),
+                drained_after,
+                "" if drained_after < timeout else " (timed out)",
+            )
+        )
+        self.stdout.write(
+            "  processing latency: p50 {}, p95 {}, p99 {}".format(
+                _ms(points[50]), _ms(points[95]), _ms(points[99])
+            )
+        )
+        if wallets:
+            self.stdout.write(
+                "  wallet syncs still pending: {}".format(pending_syncs.count())
+            )
@@ -1,49 +1,102 @@
 import hmac
 import hashlib
-from django.core.exceptions import PermissionDenied
 import json
-from types import SimpleNamespace
-from django.urls import resolve
+from functools import cached_property
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import PermissionDenied
 from decouple import config
 
 
+def is_valid_signature(body: bytes, signature: str, signing_key: bytes) -> bool:
+    """
+    Checks the `x-alchemy-signature` header against the HMAC of the raw body
+    """
+    digest = hmac.new(signing_key, msg=body, digestmod=hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature.encode(), digest.encode())
+
+
 def is_valid_signature_for_string_body(
     body: str, signature: str, signing_key: str
 ) -> bool:
-    digest = hmac.new(
-        bytes(signing_key, "utf-8"),
-        msg=bytes(body, "utf-8"),
-        digestmod=hashlib.sha256,
-    ).hexdigest()
-
-    return signature == digest
+    return is_valid_signature(
+        bytes(body, "utf-8"), signature, bytes(signing_key, "utf-8")
+    )
 
 
 class AlchemyWebhookEvent:
-    def __init__(self, webhookId, id, createdAt, type, event):
-        self.webhook_id = webhookId
-        self.id = id
-        self.created_at = createdAt
-        self.type = type
-        self.event = event
+    """
+    Alchemy webhook payload. The body is only parsed when a field is first read.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    @cached_property
+    def _payload(self):
+        return json.loads(self.body)
+
+    @property
+    def webhook_id(self):
+        return self._payload["webhookId"]
+
+    @property
+    def id(self):
+        return self._payload["id"]
+
+    @property
+    def created_at(self):
+        return self._payload["createdAt"]
+
+    @property
+    def type(self):
+        return self._payload["type"]
+
+    @property
+    def event(self):
+        return self._payload["event"]
+
+    def to_dict(self):
+        return {
+            "webhookId": self.webhook_id,
+            "id": self.id,
+            "createdAt": self.created_at,
+            "type": self.type,
+            "event": self.event,
+        }
 
 
 class AlchemyRequestHandlerMiddleware:
+    """
+    Verifies the Alchemy signature of requests to ALCHEMY_WEBHOOK_PATH and
+    attaches the (lazily parsed) event as `request.alchemy_webhook_event`.
+    Other paths go straight through. Works under both WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.webhook_path = config("ALCHEMY_WEBHOOK_PATH", default="/api/v1/webhook/")
+        self.signing_key = bytes(config("ALCHEMY_WEBHOOK_SIGNING_KEY"), "utf-8")
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def process_webhook(self, request):
+        if not request.path_info.startswith(self.webhook_path):
+            return
+        signature = request.headers.get("x-alchemy-signature", "")
+        if not is_valid_signature(request.body, signature, self.signing_key):
+            raise PermissionDenied("Signature validation failed, unauthorized!")
+        request.alchemy_webhook_event = AlchemyWebhookEvent(request.body)
 
     def __call__(self, request):
-        resolved = resolve(request.path_info)
-        if "webhook" in resolved.url_name:
-            str_body = str(request.body, request.encoding or "utf-8")
-            signature = request.headers["x-alchemy-signature"]
-            if not is_valid_signature_for_string_body(
-                str_body, signature, config("ALCHEMY_WEBHOOK_SIGNING_KEY")
-            ):
-                raise PermissionDenied("Signature validation failed, unauthorized!")
-
-            webhook_event = json.loads(str_body)
-            request.alchemy_webhook_event = AlchemyWebhookEvent(**webhook_event)
-
-        response = self.get_response(request)
-        return response
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_webhook(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.process_webhook(request)
+        return await self.get_response(request)
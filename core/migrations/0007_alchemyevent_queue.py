@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_alchemyevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="alchemyevent",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="alchemyevent",
+            name="last_error",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="alchemyevent",
+            name="locked_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="alchemyevent",
+            name="payload",
+            field=models.JSONField(
+                blank=True,
+                help_text="Verified AlchemyWebhookEvent payload waiting to be processed",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="alchemyevent",
+            name="processed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="alchemyevent",
+            index=models.Index(
+                fields=["processed", "created_at"],
+                name="core_alchem_process_8b8aa3_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_alchemyevent_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingWalletSync",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("activities", models.JSONField(default=list)),
+                ("event_ids", models.JSONField(default=list)),
+                (
+                    "previous_tokens",
+                    models.JSONField(
+                        default=list,
+                        help_text="Wallet positions captured when the first event of the window arrived",
+                    ),
+                ),
+                ("first_event_at", models.DateTimeField(auto_now_add=True)),
+                ("due_at", models.DateTimeField()),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("locked_until", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, null=True)),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_syncs",
+                        to="core.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["due_at"], name="core_pendin_due_at_9642b9_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def normalize_token_addresses(apps, schema_editor):
+    Token = apps.get_model("core", "Token")
+    WalletToken = apps.get_model("core", "WalletToken")
+
+    for token in Token.objects.exclude(address=Lower("address")).order_by(
+        "-updated_at"
+    ):
+        canonical = token.address.lower()
+        existing = Token.objects.filter(address=canonical).first()
+        if existing is None:
+            Token.objects.filter(pk=token.pk).update(address=canonical)
+            continue
+
+        # Merge the mixed-case duplicate into the canonical row
+        for wallet_token in WalletToken.objects.filter(token=token):
+            if WalletToken.objects.filter(
+                wallet_id=wallet_token.wallet_id, token=existing
+            ).exists():
+                wallet_token.delete()
+            else:
+                WalletToken.objects.filter(pk=wallet_token.pk).update(token=existing)
+        token.delete()
+
+
+def normalize_wallet_addresses(apps, schema_editor):
+    Wallet = apps.get_model("core", "Wallet")
+    WalletToken = apps.get_model("core", "WalletToken")
+    PendingWalletSync = apps.get_model("core", "PendingWalletSync")
+
+    for wallet in Wallet.objects.exclude(address=Lower("address")).order_by(
+        "-updated_at"
+    ):
+        canonical = wallet.address.lower()
+        existing = Wallet.objects.filter(address=canonical).first()
+        if existing is None:
+            Wallet.objects.filter(pk=wallet.pk).update(address=canonical)
+            continue
+
+        # Merge the mixed-case duplicate into the canonical row
+        for wallet_token in WalletToken.objects.filter(wallet=wallet):
+            if WalletToken.objects.filter(
+                wallet=existing, token_id=wallet_token.token_id
+            ).exists():
+                wallet_token.delete()
+            else:
+                WalletToken.objects.filter(pk=wallet_token.pk).update(wallet=existing)
+        PendingWalletSync.objects.filter(wallet=wallet).update(wallet=existing)
+        handles = {
+            field: getattr(wallet, field)
+            for field in ("farcaster_handle", "twitter_handle")
+            if getattr(wallet, field) and not getattr(existing, field)
+        }
+        wallet.delete()
+        if handles:
+            Wallet.objects.filter(pk=existing.pk).update(**handles)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_pendingwalletsync"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_token_addresses, migrations.RunPython.noop),
+        migrations.RunPython(normalize_wallet_addresses, migrations.RunPython.noop),
+    ]
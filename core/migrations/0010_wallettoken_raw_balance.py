@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_normalize_addresses"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wallet",
+            name="last_full_sync_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="wallettoken",
+            name="raw_balance",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=0,
+                help_text="Exact on-chain balance in the token's smallest unit",
+                max_digits=78,
+                null=True,
+            ),
+        ),
+    ]
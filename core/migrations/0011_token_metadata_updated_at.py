@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_wallettoken_raw_balance"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="token",
+            name="metadata_updated_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the static CoinGecko metadata was last fetched",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_token_metadata_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenCategoryCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("coingecko_id", models.CharField(max_length=50)),
+                ("content_hash", models.CharField(max_length=64)),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("MAJORS", "Major currencies"),
+                            ("STABLES", "Stablecoins"),
+                            ("ALTS", "Altcoins"),
+                            ("MEMES", "Memecoins"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "token_category_cache",
+                "unique_together": {("coingecko_id", "content_hash")},
+            },
+        ),
+    ]
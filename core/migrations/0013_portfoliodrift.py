@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_tokencategorycache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PortfolioDrift",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "max_deviation",
+                    models.FloatField(
+                        help_text="Largest absolute category deviation from the target, in points"
+                    ),
+                ),
+                ("total_value_usd", models.FloatField(default=0)),
+                ("distribution", models.JSONField(default=dict)),
+                ("deviations", models.JSONField(default=dict)),
+                ("scanned_at", models.DateTimeField()),
+                (
+                    "wallet",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="portfolio_drift",
+                        to="core.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "portfolio_drifts",
+                "ordering": ["-max_deviation"],
+                "indexes": [
+                    models.Index(
+                        fields=["-max_deviation"], name="portfolio_d_max_dev_7ddbdb_idx"
+                    )
+                ],
+            },
+        ),
+    ]
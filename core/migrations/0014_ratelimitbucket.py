@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_portfoliodrift"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateLimitBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("provider", models.CharField(max_length=50, unique=True)),
+                ("tokens", models.FloatField(default=0)),
+                ("updated_at", models.DateTimeField()),
+                (
+                    "blocked_until",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Set from a Retry-After header: nobody calls the provider before then",
+                        null=True,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "rate_limit_buckets",
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_ratelimitbucket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="token",
+            name="is_spam",
+            field=models.BooleanField(
+                default=False,
+                help_text="Spam tokens are dropped from wallet syncs before any lookup",
+            ),
+        ),
+    ]
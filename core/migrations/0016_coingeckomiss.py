@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_token_is_spam"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CoinGeckoMiss",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("coingecko_chain_id", models.CharField(max_length=50)),
+                ("address", models.CharField(max_length=255)),
+                ("miss_count", models.PositiveIntegerField(default=1)),
+                ("first_missed_at", models.DateTimeField(auto_now_add=True)),
+                ("checked_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "coingecko_misses",
+                "indexes": [
+                    models.Index(
+                        fields=["checked_at"], name="coingecko_m_checked_b5ed24_idx"
+                    )
+                ],
+                "unique_together": {("coingecko_chain_id", "address")},
+            },
+        ),
+    ]
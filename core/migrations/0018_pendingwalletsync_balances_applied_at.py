@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_socialpost"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pendingwalletsync",
+            name="balances_applied_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the activities were applied to the wallet balances",
+                null=True,
+            ),
+        ),
+    ]
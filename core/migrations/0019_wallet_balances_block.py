@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_pendingwalletsync_balances_applied_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wallet",
+            name="balances_block",
+            field=models.BigIntegerField(
+                blank=True,
+                help_text="Block number the balances of the last full sync were read at",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_wallet_balances_block"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pendingwalletsync",
+            name="previous_tokens",
+            field=models.JSONField(
+                default=list,
+                help_text="Wallet positions captured right before the activities were applied",
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+from django.db import migrations, models
+
+# WEBHOOK_WORKER_MAX_ATTEMPTS default when the rows were given up on
+MAX_ATTEMPTS = 5
+
+
+def mark_dead_rows_failed(apps, schema_editor):
+    AlchemyEvent = apps.get_model("core", "AlchemyEvent")
+    PendingWalletSync = apps.get_model("core", "PendingWalletSync")
+
+    AlchemyEvent.objects.filter(
+        processed=False, attempts__gte=MAX_ATTEMPTS, last_error__isnull=False
+    ).update(failed=True)
+    PendingWalletSync.objects.filter(
+        attempts__gte=MAX_ATTEMPTS, last_error__isnull=False
+    ).update(failed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_alter_pendingwalletsync_previous_tokens"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="alchemyevent",
+            name="failed",
+            field=models.BooleanField(
+                default=False,
+                help_text="Gave up after the max attempts; see last_error",
+            ),
+        ),
+        migrations.AddField(
+            model_name="pendingwalletsync",
+            name="failed",
+            field=models.BooleanField(
+                default=False,
+                help_text="Gave up after the max attempts; see last_error",
+            ),
+        ),
+        migrations.RunPython(mark_dead_rows_failed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:36
+
+import core.models.fields
+from django.db import migrations
+
+
+def resync_sqlite_wallets(apps, schema_editor):
+    # SQLite stored the larger raw balances as floats: the next window of every
+    # wallet runs a full sync, which writes them again exactly
+    if schema_editor.connection.vendor == "sqlite":
+        apps.get_model("core", "Wallet").objects.update(last_full_sync_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0021_failed_status"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="wallettoken",
+            name="raw_balance",
+            field=core.models.fields.RawAmountField(
+                blank=True,
+                help_text="Exact on-chain balance in the token's smallest unit",
+                max_length=78,
+                null=True,
+            ),
+        ),
+        migrations.RunPython(resync_sqlite_wallets, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,8 @@
 from .wallet import *
 from .token import *
 from .alchemy_event import *
+from .wallet_sync import *
+from .portfolio_drift import *
+from .rate_limit import *
+from .coingecko_miss import *
+from .social_post import *
@@ -1,24 +1,117 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
 
 class AlchemyEvent(models.Model):
     event_id = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     processed = models.BooleanField(default=False)
+    failed = models.BooleanField(
+        default=False,
+        help_text="Gave up after the max attempts; see last_error",
+    )
+
+    payload = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Verified AlchemyWebhookEvent payload waiting to be processed",
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
 
     class Meta:
         indexes = [
             models.Index(fields=["event_id"]),
+            models.Index(fields=["processed", "created_at"]),
         ]
 
     def __str__(self):
         return f"AlchemyEvent {self.event_id}"
 
     @classmethod
-    def save_if_not_exists(cls, event_id):
+    def save_if_not_exists(cls, event_id, payload=None):
         """
         Salva o event_id se ele não existir no banco.
         Retorna (objeto, created) onde created é True se foi criado, False se já existia
         """
-        obj, created = cls.objects.get_or_create(event_id=event_id)
-        return obj, created
\ No newline at end of file
+        obj, created = cls.objects.get_or_create(
+            event_id=event_id, defaults={"payload": payload}
+        )
+        return obj, created
+
+    @classmethod
+    async def asave_if_not_exists(cls, event_id, payload=None):
+        """
+        Async counterpart of `save_if_not_exists`, on the native async ORM
+        """
+        return await cls.objects.aget_or_create(
+            event_id=event_id, defaults={"payload": payload}
+        )
+
+    @classmethod
+    def claim_pending(cls, limit, lease_seconds, max_attempts):
+        """
+        Claims up to `limit` unprocessed events for this worker.
+        Rows locked by other workers are skipped (SELECT ... FOR UPDATE SKIP LOCKED)
+        and each claimed row gets a lease, so a crashed worker's events are
+        picked up again once the lease expires.
+        Returns the list of claimed primary keys.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(
+                    processed=False,
+                    failed=False,
+                    payload__isnull=False,
+                    attempts__lt=max_attempts,
+                )
+                .filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now))
+                .order_by("created_at")
+                .values_list("pk", flat=True)[:limit]
+            )
+            cls.objects.filter(pk__in=claimed).update(
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=F("attempts") + 1,
+            )
+        return claimed
+
+    def mark_processed(self):
+        self.processed = True
+        self.processed_at = timezone.now()
+        self.locked_until = None
+        self.last_error = None
+        self.save(
+            update_fields=["processed", "processed_at", "locked_until", "last_error"]
+        )
+
+    def mark_failed(self, error, retry_delay_seconds, max_attempts):
+        """
+        Records the error and keeps the event locked until the retry delay
+        expires, or gives up after `max_attempts`
+        """
+        self.last_error = str(error)
+        if self.attempts >= max_attempts:
+            self.failed = True
+            print(
+                "Giving up on {} after {} attempts: {}".format(
+                    self, self.attempts, error
+                )
+            )
+        self.locked_until = timezone.now() + timedelta(seconds=retry_delay_seconds)
+        self.save(update_fields=["last_error", "failed", "locked_until"])
+
+    @classmethod
+    def retry(cls, queryset):
+        """
+        Puts failed events back in the queue with fresh attempts
+        """
+        return queryset.filter(processed=False).update(
+            failed=False, attempts=0, locked_until=None
+        )
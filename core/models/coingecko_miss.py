@@ -0,0 +1,130 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from decouple import config
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+
+class CoinGeckoMiss(models.Model):
+    """
+    Contract that CoinGecko answered 404 for. Lookups for it are skipped until
+    the entry is older than COINGECKO_MISS_TTL_SECONDS, or it is re-checked
+    with `recheck_coingecko_misses` (or the admin action).
+    """
+
+    coingecko_chain_id = models.CharField(max_length=50)
+    address = models.CharField(max_length=255)
+    miss_count = models.PositiveIntegerField(default=1)
+    first_missed_at = models.DateTimeField(auto_now_add=True)
+    checked_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "coingecko_misses"
+        unique_together = ("coingecko_chain_id", "address")
+        indexes = [
+            models.Index(fields=["checked_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.address} @ {self.coingecko_chain_id}"
+
+    @staticmethod
+    def ttl():
+        return timedelta(
+            seconds=config("COINGECKO_MISS_TTL_SECONDS", default=24 * 60 * 60, cast=int)
+        )
+
+    @classmethod
+    def expired(cls):
+        return cls.objects.filter(checked_at__lt=timezone.now() - cls.ttl())
+
+    @classmethod
+    def fresh_misses(cls, coingecko_chain_id, addresses):
+        """
+        The addresses with a miss younger than the TTL, i.e. not worth a lookup
+        """
+        return set(
+            cls.objects.filter(
+                coingecko_chain_id=coingecko_chain_id,
+                address__in=list(addresses),
+                checked_at__gte=timezone.now() - cls.ttl(),
+            ).values_list("address", flat=True)
+        )
+
+    @classmethod
+    def record(cls, coingecko_chain_id, addresses):
+        """
+        Remembers new misses and refreshes the known ones
+        """
+        if not addresses:
+            return
+        now = timezone.now()
+        cls.objects.filter(
+            coingecko_chain_id=coingecko_chain_id, address__in=addresses
+        ).update(checked_at=now, miss_count=F("miss_count") + 1)
+        cls.objects.bulk_create(
+            [
+                cls(
+                    coingecko_chain_id=coingecko_chain_id,
+                    address=address,
+                    checked_at=now,
+                )
+                for address in addresses
+            ],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def forget(cls, coingecko_chain_id, addresses):
+        """
+        Drops the entries of contracts CoinGecko now knows
+        """
+        if addresses:
+            cls.objects.filter(
+                coingecko_chain_id=coingecko_chain_id, address__in=addresses
+            ).delete()
+
+    @classmethod
+    def recheck(cls, misses):
+        """
+        Looks the given entries up on CoinGecko again, concurrently (bounded by
+        the CoinGecko semaphore and rate limiter). Entries CoinGecko now lists are
+        dropped, the others are refreshed. Returns (found, still_missing) counts.
+        """
+        from core.services.blockchain import (
+            CoinGeckoNotFound,
+            acheck_coingecko_by_contract,
+        )
+
+        misses = list(misses)
+
+        async def check(miss):
+            try:
+                await acheck_coingecko_by_contract(
+                    miss.coingecko_chain_id, miss.address, categorize=False
+                )
+                return True
+            except CoinGeckoNotFound:
+                return False
+            except Exception as e:
+                print("Error re-checking {} on CoinGecko: {}".format(miss, e))
+                return None
+
+        async def check_all():
+            return await asyncio.gather(*[check(miss) for miss in misses])
+
+        found, still_missing = [], []
+        for miss, listed in zip(misses, async_to_sync(check_all)()):
+            if listed:
+                found.append(miss.pk)
+            elif listed is False:
+                still_missing.append(miss.pk)
+
+        cls.objects.filter(pk__in=found).delete()
+        cls.objects.filter(pk__in=still_missing).update(
+            checked_at=timezone.now(), miss_count=F("miss_count") + 1
+        )
+        return len(found), len(still_missing)
@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+from django.db import models
+
+
+class RawAmountField(models.CharField):
+    """
+    Non-negative integer of any size (e.g. a uint256 token amount), stored as a
+    decimal string. A DecimalField is not exact on SQLite, which keeps numbers
+    past 64 bits as floats.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", 78)
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        # Decimal also parses the floats SQLite may have stored before
+        return int(Decimal(value))
+
+    def get_prep_value(self, value):
+        value = self.to_python(value)
+        return None if value is None else str(value)
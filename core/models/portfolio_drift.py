@@ -0,0 +1,31 @@
+from django.db import models
+
+from core.models.wallet import Wallet
+
+
+class PortfolioDrift(models.Model):
+    """
+    Latest deviation of a wallet's allocation from its target portfolio, as
+    computed by the `drift_scan` command with fresh prices.
+    """
+
+    wallet = models.OneToOneField(
+        Wallet, on_delete=models.CASCADE, related_name="portfolio_drift"
+    )
+    max_deviation = models.FloatField(
+        help_text="Largest absolute category deviation from the target, in points"
+    )
+    total_value_usd = models.FloatField(default=0)
+    distribution = models.JSONField(default=dict)
+    deviations = models.JSONField(default=dict)
+    scanned_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "portfolio_drifts"
+        ordering = ["-max_deviation"]
+        indexes = [
+            models.Index(fields=["-max_deviation"]),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet}: {self.max_deviation:.2f}"
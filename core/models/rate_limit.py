@@ -0,0 +1,24 @@
+from django.db import models
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket of an external API provider, shared by every process.
+    `tokens` may go negative: each caller reserves a token and waits until it
+    is refilled (see `core.services.rate_limit`).
+    """
+
+    provider = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField(default=0)
+    updated_at = models.DateTimeField()
+    blocked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Set from a Retry-After header: nobody calls the provider before then",
+    )
+
+    class Meta:
+        db_table = "rate_limit_buckets"
+
+    def __str__(self):
+        return f"{self.provider}: {self.tokens:.2f}"
@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models.wallet import Wallet
+
+
+class SocialPost(models.Model):
+    """
+    Outbox of generated messages. The pipeline only stores them; they are
+    posted by the `dispatch_social_posts` command.
+    """
+
+    PLATFORM_CHOICES = [
+        ("farcaster", "Farcaster"),
+        ("twitter", "Twitter"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="social_posts",
+    )
+    platform = models.CharField(max_length=20, choices=PLATFORM_CHOICES)
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    external_id = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="Id of the cast or tweet once posted",
+    )
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "social_posts"
+        indexes = [
+            models.Index(fields=["platform", "status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"SocialPost {self.pk} ({self.platform}, {self.status})"
+
+    @classmethod
+    def claim_pending(cls, platform, limit, lease_seconds):
+        """
+        Claims up to `limit` pending posts of `platform`, oldest first, skipping
+        rows locked by other dispatchers. Returns the claimed objects.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(platform=platform, status="pending")
+                .filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now))
+                .order_by("created_at")[:limit]
+            )
+            cls.objects.filter(pk__in=[post.pk for post in claimed]).update(
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=F("attempts") + 1,
+            )
+        for post in claimed:
+            post.attempts += 1
+        return claimed
+
+    def mark_sent(self, external_id):
+        self.status = "sent"
+        self.external_id = external_id
+        self.sent_at = timezone.now()
+        self.locked_until = None
+        self.last_error = None
+        self.save(
+            update_fields=[
+                "status",
+                "external_id",
+                "sent_at",
+                "locked_until",
+                "last_error",
+            ]
+        )
+
+    def mark_failed(self, error, retry_delay_seconds, max_attempts):
+        """
+        Records the error and keeps the post locked until the retry delay
+        expires, or gives up after `max_attempts`
+        """
+        self.last_error = str(error)
+        if self.attempts >= max_attempts:
+            self.status = "failed"
+        self.locked_until = timezone.now() + timedelta(seconds=retry_delay_seconds)
+        self.save(update_fields=["last_error", "status", "locked_until"])
@@ -1,6 +1,9 @@
 from django.db import models
 from django.db.models import JSONField
 
+from core.models.fields import RawAmountField
+from core.utils import normalize_address
+
 
 class Token(models.Model):
 
@@ -36,22 +39,96 @@ class Token(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     market_data = JSONField(default=dict, null=True, blank=True)
+    is_spam = models.BooleanField(
+        default=False,
+        help_text="Spam tokens are dropped from wallet syncs before any lookup",
+    )
+    metadata_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the static CoinGecko metadata was last fetched",
+    )
 
     def __str__(self):
         return f"{self.symbol} @ {self.chain_id} ({self.address})"
 
+    def save(self, *args, **kwargs):
+        self.address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
     class Meta:
         db_table = "tokens"
         ordering = ["name"]
 
 
 class WalletToken(models.Model):
+    SNAPSHOT_FIELDS = (
+        "token__address",
+        "token__symbol",
+        "token__category",
+        "token__name",
+        "token__coingecko_id",
+        "token__chain_id",
+        "token__coingecko_chain_id",
+        "token__description",
+        "token__logo_url",
+        "balance",
+        "balance_usd",
+    )
+
     wallet = models.ForeignKey("Wallet", on_delete=models.CASCADE)
     token = models.ForeignKey(Token, on_delete=models.CASCADE)
     balance = models.FloatField(default=0)
     balance_usd = models.FloatField(default=0)
+    raw_balance = RawAmountField(
+        null=True,
+        blank=True,
+        help_text="Exact on-chain balance in the token's smallest unit",
+    )
     last_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "wallet_tokens"
         unique_together = ("wallet", "token")
+
+    @classmethod
+    def snapshot(cls, wallet):
+        """
+        Returns the wallet positions with a positive balance as plain dicts
+        """
+        return list(
+            cls.objects.filter(wallet=wallet, balance__gt=0)
+            .select_related("token")
+            .values(*cls.SNAPSHOT_FIELDS)
+        )
+
+    @classmethod
+    async def asnapshot(cls, wallet):
+        """
+        Async counterpart of `snapshot`, on the native async ORM
+        """
+        return [
+            position
+            async for position in cls.objects.filter(wallet=wallet, balance__gt=0)
+            .select_related("token")
+            .values(*cls.SNAPSHOT_FIELDS)
+        ]
+
+
+class TokenCategoryCache(models.Model):
+    """
+    Memoized LLM categorization, keyed by the CoinGecko id and a hash of the
+    description and categories that were sent to the model
+    """
+
+    coingecko_id = models.CharField(max_length=50)
+    content_hash = models.CharField(max_length=64)
+    category = models.CharField(max_length=20, choices=Token.CATEGORY_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "token_category_cache"
+        unique_together = ("coingecko_id", "content_hash")
+
+    def __str__(self):
+        return f"{self.coingecko_id}: {self.category}"
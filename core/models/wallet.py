@@ -1,5 +1,8 @@
-import requests
-from django.db import models
+import asyncio
+from asgiref.sync import async_to_sync, sync_to_async
+from datetime import timedelta
+from django.db import models, transaction
+from django.utils import timezone
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from decouple import config
@@ -7,125 +10,695 @@ from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.db.models import JSONField
 
+from core.services.http import request
+from core.services.categorization import categorize_token_infos
+from core.services.prices import aget_token_prices, get_token_prices
 from core.services import (
-    check_coingecko_by_contract,
-    check_coingecko_by_coin,
-    get_eth_balance_etherscan,
-    get_token_balance_alchemy,
+    CoinGeckoNotFound,
+    acheck_coingecko_by_contract,
+    acheck_coingecko_by_coin,
+    aget_tokens_metadata_alchemy,
+    get_native_balance_alchemy,
+    get_wallet_balances_alchemy,
+    parse_alchemy_token_metadata,
 )
+from core.services.spam import known_spam_addresses, looks_like_spam
+from core.models.coingecko_miss import CoinGeckoMiss
 from core.models.token import Token, WalletToken
+from core.utils import normalize_address
+
+# Placeholder contract address used to store the native (ETH) balance
+NATIVE_TOKEN_ADDRESS = "0x0000000000000000000000000000000000000001"
+
+
+# Columns refreshed when a Token row is upserted
+TOKEN_UPSERT_FIELDS = [
+    "chain_id",
+    "coingecko_chain_id",
+    "coingecko_id",
+    "decimals",
+    "symbol",
+    "name",
+    "description",
+    "logo_url",
+    "category",
+    "market_data",
+    "metadata_updated_at",
+    "updated_at",
+]
+
+
+def _is_dust(raw_balance, decimals, price_usd):
+    """
+    Whether a position is worth less than TOKEN_DUST_THRESHOLD_USD
+    """
+    dust_threshold = config("TOKEN_DUST_THRESHOLD_USD", default=1, cast=float)
+    return raw_balance / 10**decimals * price_usd < dust_threshold
 
 
-def _add_token_to_wallet(
-    wallet, token_contract_address, token_info, token_balance_decimal
-):
-    token_obj, _ = Token.objects.update_or_create(
-        address=token_contract_address,
+def _token_from_info(wallet, token_contract_address, token_info, metadata_updated_at):
+    return Token(
+        address=normalize_address(token_contract_address),
         chain_id=wallet.chain_id,
         coingecko_chain_id=wallet.coingecko_network,
-        defaults={
-            "coingecko_id": token_info.get("token_id"),
-            "decimals": token_info.get("token_decimals"),
-            "symbol": token_info.get("token_symbol"),
-            "name": token_info.get("token_name"),
-            "description": token_info.get("token_description"),
-            "logo_url": token_info.get("logo_url"),
-            "category": token_info.get("token_category"),
-            "market_data": token_info.get("market_data"),
-        },
-    )
-
-    token_price_usd = token_info.get("token_price_usd")
-    # print("token_price: {}".format(token_price_usd))
-    token_balance = token_balance_decimal / 10**token_obj.decimals
-    # print("token_balance: {}".format(token_balance))
-    token_balance_usd = token_price_usd * token_balance
-    # print("token_amount_usd: {}".format(token_balance_usd))
+        coingecko_id=token_info.get("token_id"),
+        decimals=token_info.get("token_decimals"),
+        symbol=token_info.get("token_symbol"),
+        name=token_info.get("token_name"),
+        description=token_info.get("token_description"),
+        logo_url=token_info.get("logo_url"),
+        category=token_info.get("token_category"),
+        market_data=token_info.get("market_data"),
+        metadata_updated_at=metadata_updated_at,
+    )
+
 
-    WalletToken.objects.update_or_create(
+def _wallet_token(wallet, token_obj, token_price_usd, token_balance_decimal):
+    token_balance = token_balance_decimal / 10**token_obj.decimals
+    return WalletToken(
         wallet=wallet,
         token=token_obj,
-        defaults={
-            "balance": token_balance,
-            "balance_usd": token_balance_usd,
-        },
+        balance=token_balance,
+        balance_usd=token_price_usd * token_balance,
+        raw_balance=token_balance_decimal,
     )
-    return token_obj
 
 
-def sync_wallet(wallet):
-    try:
-        # 1. Get token balances from Alchemy
-        tokens = get_token_balance_alchemy(wallet.alchemy_network, wallet.address)
-    except Exception as e:
-        print("Error getting token balances from Alchemy: {}".format(e))
-        return
+def _upsert_tokens(tokens):
+    """
+    Inserts or updates Token rows (matched on address) in one statement and
+    returns the stored rows keyed by address.
+    """
+    Token.objects.bulk_create(
+        tokens,
+        update_conflicts=True,
+        unique_fields=["address"],
+        update_fields=TOKEN_UPSERT_FIELDS,
+    )
+    return {
+        token.address: token
+        for token in Token.objects.filter(address__in=[t.address for t in tokens])
+    }
+
+
+def _upsert_wallet_tokens(wallet_tokens):
+    """
+    Inserts or updates WalletToken rows (matched on wallet and token) in one statement
+    """
+    WalletToken.objects.bulk_create(
+        wallet_tokens,
+        update_conflicts=True,
+        unique_fields=["wallet", "token"],
+        update_fields=["balance", "balance_usd", "raw_balance", "last_updated"],
+    )
+
+
+def _cached_tokens(chain_id, contract_addresses):
+    """
+    Tokens whose static metadata is younger than TOKEN_METADATA_TTL_SECONDS,
+    keyed by address. Only their price needs to be fetched.
+    """
+    ttl = config("TOKEN_METADATA_TTL_SECONDS", default=7 * 24 * 60 * 60, cast=int)
+    return {
+        token.address: token
+        for token in Token.objects.filter(
+            chain_id=chain_id,
+            address__in=contract_addresses,
+            metadata_updated_at__gte=timezone.now() - timedelta(seconds=ttl),
+        )
+    }
+
+
+def _stored_prices(chain_id, contract_addresses):
+    """
+    Last USD price stored for each known token, keyed by address
+    """
+    return {
+        address: market_data["current_price_usd"]
+        for address, market_data in Token.objects.filter(
+            chain_id=chain_id, address__in=contract_addresses
+        ).values_list("address", "market_data")
+        if (market_data or {}).get("current_price_usd") is not None
+    }
+
+
+async def _fetch_token_data(wallet, balances, cached_tokens, stored_prices):
+    """
+    Prices every held token (see `aget_token_prices`) and reads the Alchemy
+    metadata of new or stale tokens (one JSON-RPC batch), concurrently.
+    A token without a price falls back to its `stored_prices` entry.
+    Positions worth less than TOKEN_DUST_THRESHOLD_USD, unpriced tokens and
+    tokens whose name looks like spam are dropped there; only the remaining
+    new or stale tokens are looked up, concurrently, on CoinGecko (full info,
+    uncategorized). The Alchemy metadata fills in the tokens CoinGecko does
+    not list or has no decimals for.
+    Each provider is bounded by its own semaphore (see `provider_semaphore`).
+    Returns the kept balances, the token infos (None when not found) and the
+    prices, keyed by contract address, the metadata of the spam tokens and the
+    addresses of the unpriced tokens.
+    """
+    network = wallet.coingecko_network
+
+    not_found = []
+
+    async def fetch_info(contract_address):
+        try:
+            if contract_address == NATIVE_TOKEN_ADDRESS:
+                return await acheck_coingecko_by_coin("ethereum", categorize=False)
+            return await acheck_coingecko_by_contract(
+                network, contract_address, categorize=False
+            )
+        except CoinGeckoNotFound:
+            not_found.append(contract_address)
+            return None
+        except Exception as e:
+            print("Error getting token info from CoinGecko: {}".format(e))
+            return None
+
+    async def fetch_metadata(contract_addresses):
+        try:
+            return await aget_tokens_metadata_alchemy(
+                wallet.alchemy_network, contract_addresses
+            )
+        except Exception as e:
+            print("Error getting token metadata from Alchemy: {}".format(e))
+            return {}
+
+    native_coin_id = "ethereum"
+    if NATIVE_TOKEN_ADDRESS in cached_tokens:
+        native_coin_id = cached_tokens[NATIVE_TOKEN_ADDRESS].coingecko_id or "ethereum"
+
+    (prices, coin_prices), alchemy_metadata = await asyncio.gather(
+        aget_token_prices(
+            [
+                (network, address)
+                for address in balances
+                if address != NATIVE_TOKEN_ADDRESS
+            ],
+            [native_coin_id] if NATIVE_TOKEN_ADDRESS in balances else [],
+        ),
+        fetch_metadata(
+            [
+                address
+                for address in balances
+                if address not in cached_tokens and address != NATIVE_TOKEN_ADDRESS
+            ]
+        ),
+    )
+    token_prices = {address: price for (_, address), price in prices.items()}
+    if native_coin_id in coin_prices:
+        token_prices[NATIVE_TOKEN_ADDRESS] = coin_prices[native_coin_id]
+
+    for address, price in stored_prices.items():
+        if token_prices.get(address) is None:
+            token_prices[address] = price
+
+    held_balances = {}
+    spam_tokens = {}
+    unpriced = []
+    for address, raw_balance in balances.items():
+        price = token_prices.get(address)
+        if address in cached_tokens:
+            decimals = cached_tokens[address].decimals
+        elif address == NATIVE_TOKEN_ADDRESS:
+            decimals = 18
+        else:
+            token_metadata = alchemy_metadata.get(address) or {}
+            if looks_like_spam(token_metadata):
+                spam_tokens[address] = token_metadata
+                continue
+            decimals = token_metadata.get("decimals")
+
+        if price is None:
+            unpriced.append(address)
+            continue
+        if decimals is not None and _is_dust(raw_balance, decimals, price):
+            continue
+        held_balances[address] = raw_balance
+
+    skipped = len(balances) - len(held_balances)
+    if skipped:
+        print(
+            "Skipping {} spam, dust or unpriced tokens ({} spam, {} unpriced)".format(
+                skipped, len(spam_tokens), len(unpriced)
+            )
+        )
+
+    metadata_addresses = [
+        address for address in held_balances if address not in cached_tokens
+    ]
+    # Contracts CoinGecko recently answered 404 for are not looked up again
+    misses = await sync_to_async(CoinGeckoMiss.fresh_misses)(
+        network, metadata_addresses
+    )
+    lookup_addresses = [a for a in metadata_addresses if a not in misses]
+    token_infos = {address: None for address in metadata_addresses}
+    token_infos.update(
+        zip(
+            lookup_addresses,
+            await asyncio.gather(*[fetch_info(a) for a in lookup_addresses]),
+        )
+    )
+    await sync_to_async(CoinGeckoMiss.record)(network, not_found)
+    await sync_to_async(CoinGeckoMiss.forget)(
+        network,
+        [
+            address
+            for address in lookup_addresses
+            if token_infos[address] is not None and address != NATIVE_TOKEN_ADDRESS
+        ],
+    )
+    for address in metadata_addresses:
+        token_metadata = alchemy_metadata.get(address) or {}
+        if token_metadata.get("decimals") is None:
+            continue
+        if token_infos[address] is None:
+            token_infos[address] = parse_alchemy_token_metadata(token_metadata)
+        elif token_infos[address].get("token_decimals") is None:
+            token_infos[address]["token_decimals"] = token_metadata["decimals"]
+
+    return held_balances, token_infos, token_prices, spam_tokens, unpriced
+
+
+def _remember_spam_tokens(wallet, spam_tokens):
+    """
+    Stores the detected spam tokens, so that later syncs drop them before any lookup
+    """
+    Token.objects.bulk_create(
+        [
+            Token(
+                address=address,
+                chain_id=wallet.chain_id,
+                coingecko_chain_id=wallet.coingecko_network,
+                decimals=token_metadata.get("decimals") or 0,
+                symbol=(token_metadata.get("symbol") or "")[:20],
+                name=(token_metadata.get("name") or "")[:255],
+                is_spam=True,
+            )
+            for address, token_metadata in spam_tokens.items()
+        ],
+        ignore_conflicts=True,
+    )
 
-    wallet_tokens = []
 
+def _stored_raw_balances(wallet):
+    return dict(
+        WalletToken.objects.filter(wallet=wallet).values_list("token", "raw_balance")
+    )
+
+
+def read_wallet_balances(wallet):
+    """
+    Network phase of a full sync: reads every balance of the wallet, prices it
+    and gets the info of new or stale tokens, without holding any lock.
+    Returns what `store_wallet_balances` writes, or None when the balances
+    could not be read.
+    """
+    # The write phase only stores the result if these did not change meanwhile
+    stored_raw_balances = _stored_raw_balances(wallet)
     try:
-        # 2. Get ETH balance
-        eth_balance = get_eth_balance_etherscan(wallet.chain_id, wallet.address)
-
-        if eth_balance > 0:
-            try:
-                # 3. Get ETH info from CoinGecko
-                token_info = check_coingecko_by_coin("ethereum")
-
-            except Exception as e:
-                print("Error getting token info from CoinGecko: {}".format(e))
-
-            try:
-                eth_obj = _add_token_to_wallet(
-                    wallet,
-                    "0x0000000000000000000000000000000000000001",
-                    token_info,
-                    eth_balance,
+        # 1-2. Get the block number, the ETH balance and the first page of token
+        # balances in a single Alchemy batch. The next pages are streamed below
+        block_number, eth_balance, tokens = get_wallet_balances_alchemy(
+            wallet.alchemy_network, wallet.address
+        )
+
+        balances = {}
+        for token in tokens:
+            token_contract_address = token.get("contractAddress")
+            token_balance_hex = token.get("tokenBalance")
+            token_balance_decimal = int(token_balance_hex, 16)
+
+            if token_balance_decimal > 0:
+                balances[normalize_address(token_contract_address)] = (
+                    token_balance_decimal
                 )
-                wallet_tokens.append(eth_obj.id)
+    except Exception as e:
+        print("Error getting balances from Alchemy: {}".format(e))
+        return None
+
+    # Known spam is dropped before any lookup
+    for address in known_spam_addresses(wallet.chain_id, balances.keys()):
+        del balances[address]
+    if eth_balance > 0:
+        balances[NATIVE_TOKEN_ADDRESS] = eth_balance
+
+    # 3. Price every token and drop spam and dust, then get the token info of
+    # the rest from CoinGecko, concurrently. Tokens with fresh metadata in the
+    # database only need their price
+    cached_tokens = _cached_tokens(wallet.chain_id, list(balances.keys()))
+    stored_prices = _stored_prices(wallet.chain_id, list(balances.keys()))
+    balances, token_infos, token_prices, spam_tokens, unvalued = async_to_sync(
+        _fetch_token_data
+    )(wallet, balances, cached_tokens, stored_prices)
+    if spam_tokens:
+        _remember_spam_tokens(wallet, spam_tokens)
+    # Categories come from the memo table, or from a single batched LLM call
+    categorize_token_infos(token_infos.values())
+
+    now = timezone.now()
+    token_rows = []
+    prices = {}
+    for token_contract_address in balances:
+        if token_contract_address in cached_tokens:
+            # Fresh metadata: only the price changes
+            token_obj = cached_tokens[token_contract_address]
+            token_price_usd = token_prices.get(token_contract_address)
+        else:
+            token_info = token_infos.get(token_contract_address)
+            if token_info is None:
+                unvalued.append(token_contract_address)
+                continue
+            token_obj = _token_from_info(
+                wallet, token_contract_address, token_info, now
+            )
+            token_price_usd = token_prices.get(token_contract_address)
+            if token_price_usd is None:
+                token_price_usd = token_info.get("token_price_usd")
+
+        if token_price_usd is None or token_obj.decimals is None:
+            print(
+                "Missing price or decimals for token {}".format(token_contract_address)
+            )
+            unvalued.append(token_contract_address)
+            continue
+        # Kept as the fallback of the next sync that gets no price
+        token_obj.market_data = dict(token_obj.market_data or {})
+        token_obj.market_data["current_price_usd"] = token_price_usd
+        token_rows.append(token_obj)
+        prices[token_contract_address] = token_price_usd
+
+    return {
+        "block_number": block_number,
+        "balances": balances,
+        "token_rows": token_rows,
+        "prices": prices,
+        "unvalued": unvalued,
+        "stored_raw_balances": stored_raw_balances,
+    }
 
-            except Exception as e:
-                print(
-                    "Error creating or updating Token or WalletToken object: {}".format(
-                        e
-                    )
-                )
 
+def store_wallet_balances(wallet, read):
+    """
+    Write phase of a full sync: every Token, then every WalletToken, is upserted
+    in bulk. The caller holds the wallet row lock (see `Wallet.lock`).
+    Returns False, without writing, when the stored balances changed since
+    `read_wallet_balances` started (deltas or another sync were applied
+    meanwhile), so the read is stale.
+    """
+    if _stored_raw_balances(wallet) != read["stored_raw_balances"] or (
+        wallet.balances_block is not None
+        and read["block_number"] < wallet.balances_block
+    ):
+        return False
+
+    tokens_by_address = _upsert_tokens(read["token_rows"])
+    _upsert_wallet_tokens(
+        [
+            _wallet_token(
+                wallet,
+                token_obj,
+                read["prices"][address],
+                read["balances"][address],
+            )
+            for address, token_obj in tokens_by_address.items()
+        ]
+    )
+    # Positions no longer held are zeroed; the ones that could not be
+    # valued this time keep their stored balance
+    WalletToken.objects.filter(wallet=wallet).exclude(
+        token__in=tokens_by_address.values()
+    ).exclude(token__address__in=read["unvalued"]).update(
+        balance=0, balance_usd=0, raw_balance=0
+    )
+
+    wallet.last_full_sync_at = timezone.now()
+    wallet.balances_block = read["block_number"]
+    wallet.save(update_fields=["last_full_sync_at", "balances_block"])
+    return True
+
+
+def sync_wallet(wallet, attempts=3):
+    """
+    Re-reads every balance of the wallet and stores its positions. The network
+    calls run without any lock; only the write phase locks the wallet row, and
+    the balances are read again when they changed in between.
+    Returns False when the balances could not be read or stored.
+    """
+    for _ in range(attempts):
+        read = read_wallet_balances(wallet)
+        if read is None:
+            return False
+        try:
+            with transaction.atomic():
+                wallet.lock()
+                if store_wallet_balances(wallet, read):
+                    return True
+        except Exception as e:
+            print(
+                "Error creating or updating Token or WalletToken objects: {}".format(e)
+            )
+            return False
+        print("Balances of wallet {} changed during the sync".format(wallet.address))
+    return False
+
+
+def _token_price_usd(token, wallet_token, prices):
+    """
+    Unit price used to value a delta: the shared price cache when it has the
+    token, else the last known valuation (None when there is none)
+    """
+    if token.address in prices:
+        return prices[token.address]
+    if wallet_token is not None and wallet_token.balance > 0:
+        return wallet_token.balance_usd / wallet_token.balance
+    return (token.market_data or {}).get("current_price_usd")
+
+
+def read_transfer_deltas(wallet, activities):
+    """
+    Network phase of applying webhook activities: parses their signed raw
+    transfer amounts and fetches the token prices and the native balance (a
+    single call, it also moves with gas), without holding any lock.
+    Transfers of spam are dropped like in a full sync, and so are the ones of
+    unknown contracts that a full sync would not keep either (spam metadata,
+    no price, or dust); spam detected here is remembered.
+    Returns what `store_transfer_deltas` writes, or None when a full sync is
+    needed instead: the wallet was never fully synced, the last full sync is
+    older than WALLET_FULL_SYNC_INTERVAL_SECONDS, a new token is received or
+    decimals do not match.
+    """
+    full_sync_interval = config(
+        "WALLET_FULL_SYNC_INTERVAL_SECONDS", default=6 * 60 * 60, cast=int
+    )
+    if wallet.last_full_sync_at is None or (
+        wallet.last_full_sync_at
+        < timezone.now() - timedelta(seconds=full_sync_interval)
+    ):
+        print("Wallet {} is due for a full sync".format(wallet.address))
+        return None
+
+    transfers = []
+    decimals = {}
+    seen = set()
+    for activity in activities:
+        key = (activity.get("hash"), activity.get("log_index"))
+        if key[0] is not None and key in seen:
+            continue
+        seen.add(key)
+
+        contract_address = normalize_address(activity.get("contract_address"))
+        raw_value = activity.get("raw_value")
+        if not contract_address or raw_value is None:
+            return None
+
+        amount = int(raw_value, 16)
+        delta = 0
+        if normalize_address(activity.get("to_address")) == wallet.address:
+            delta += amount
+        if normalize_address(activity.get("from_address")) == wallet.address:
+            delta -= amount
+        block_num = activity.get("block_num")
+        transfers.append(
+            (contract_address, int(block_num, 16) if block_num else None, delta)
+        )
+        decimals[contract_address] = activity.get("decimals")
+
+    # Known spam is dropped before any lookup
+    spam = known_spam_addresses(wallet.chain_id, decimals.keys())
+    tokens = {
+        token.address: token
+        for token in Token.objects.filter(
+            chain_id=wallet.chain_id,
+            address__in=list(decimals.keys()) + [NATIVE_TOKEN_ADDRESS],
+        ).exclude(address__in=spam)
+    }
+    for contract_address in decimals:
+        token = tokens.get(contract_address)
+        if token is None or decimals[contract_address] in (None, token.decimals):
+            continue
+        print("Decimals mismatch for {}".format(contract_address))
+        return None
+
+    unknown = [
+        address for address in decimals if address not in tokens and address not in spam
+    ]
+    unknown_metadata = {}
+    if unknown:
+        try:
+            unknown_metadata = async_to_sync(aget_tokens_metadata_alchemy)(
+                wallet.alchemy_network, unknown
+            )
+        except Exception as e:
+            print("Error getting token metadata from Alchemy: {}".format(e))
+            return None
+        spam_tokens = {
+            address: unknown_metadata.get(address) or {}
+            for address in unknown
+            if looks_like_spam(unknown_metadata.get(address) or {})
+        }
+        if spam_tokens:
+            _remember_spam_tokens(wallet, spam_tokens)
+            spam.update(spam_tokens)
+            unknown = [address for address in unknown if address not in spam_tokens]
+
+    # Warm prices from the shared cache; misses fall through to the network
+    native_coin_id = "ethereum"
+    if NATIVE_TOKEN_ADDRESS in tokens:
+        native_coin_id = tokens[NATIVE_TOKEN_ADDRESS].coingecko_id or "ethereum"
+    try:
+        token_prices, coin_prices = get_token_prices(
+            [
+                (wallet.coingecko_network, address)
+                for address in list(tokens) + unknown
+                if address != NATIVE_TOKEN_ADDRESS
+            ],
+            [native_coin_id],
+        )
     except Exception as e:
-        print("Error getting ETH balance from Etherscan: {}".format(e))
-
-    for token in tokens:
-        token_contract_address = token.get("contractAddress")
-        token_balance_hex = token.get("tokenBalance")
-        token_balance_decimal = int(token_balance_hex, 16)
-
-        if token_balance_decimal > 0:
-            try:
-                # 4. Get token info from CoinGecko
-                token_info = check_coingecko_by_contract(
-                    wallet.coingecko_network, token_contract_address
-                )
+        print("Error getting token prices: {}".format(e))
+        token_prices, coin_prices = {}, {}
+    prices = {address: price for (_, address), price in token_prices.items()}
+    if native_coin_id in coin_prices:
+        prices[NATIVE_TOKEN_ADDRESS] = coin_prices[native_coin_id]
+
+    # An unknown contract only needs a full sync when it would be kept there
+    for address in unknown:
+        received = sum(delta for a, _, delta in transfers if a == address)
+        price = prices.get(address)
+        token_decimals = decimals[address]
+        if token_decimals is None:
+            token_decimals = (unknown_metadata.get(address) or {}).get("decimals")
+        if received <= 0 or price is None:
+            continue
+        if token_decimals is None or not _is_dust(received, token_decimals, price):
+            print("Unknown token {}, full sync needed".format(address))
+            return None
+
+    skipped = [transfer for transfer in transfers if transfer[0] not in tokens]
+    if skipped:
+        print(
+            "Skipping {} transfers of spam, dust or unpriced tokens".format(
+                len(skipped)
+            )
+        )
+    transfers = [transfer for transfer in transfers if transfer[0] in tokens]
+
+    # The native balance also changes with gas, so it is always re-read
+    eth_balance = get_native_balance_alchemy(wallet.alchemy_network, wallet.address)
+    if NATIVE_TOKEN_ADDRESS not in tokens and eth_balance > 0:
+        return None
+
+    return {
+        "transfers": transfers,
+        "tokens": tokens,
+        "prices": prices,
+        "eth_balance": eth_balance,
+        "balances_block": wallet.balances_block,
+    }
 
-            except Exception as e:
-                print("Error getting token info from CoinGecko: {}".format(e))
-                continue
 
-            try:
-                token_obj = _add_token_to_wallet(
-                    wallet, token_contract_address, token_info, token_balance_decimal
-                )
-                wallet_tokens.append(token_obj.id)
+def store_transfer_deltas(wallet, read):
+    """
+    Write phase of applying webhook activities: adds the transfer amounts to the
+    stored raw balances. The caller holds the wallet row lock (see `Wallet.lock`).
+    Transfers of blocks the last full sync already read are skipped, and so is
+    the native balance when a full sync stored a newer one meanwhile.
+    Returns False, without writing, when a full sync is needed instead: the
+    reconciliation check finds drift (a balance that would become negative).
+    """
+    deltas = {}
+    covered = 0
+    for contract_address, block_num, delta in read["transfers"]:
+        if (
+            block_num is not None
+            and wallet.balances_block is not None
+            and block_num <= wallet.balances_block
+        ):
+            covered += 1
+            continue
+        deltas[contract_address] = deltas.get(contract_address, 0) + delta
+
+    if covered:
+        print(
+            "Skipping {} activities already covered by block {}".format(
+                covered, wallet.balances_block
+            )
+        )
+
+    tokens = read["tokens"]
+    prices = read["prices"]
+    wallet_tokens = {
+        wallet_token.token.address: wallet_token
+        for wallet_token in WalletToken.objects.filter(
+            wallet=wallet, token__in=tokens.values()
+        ).select_related("token")
+    }
 
-            except Exception as e:
-                print(
-                    "Error creating or updating Token or WalletToken object: {}".format(
-                        e
-                    )
+    updates = []
+    for contract_address, delta in deltas.items():
+        token = tokens[contract_address]
+        wallet_token = wallet_tokens.get(contract_address)
+        if wallet_token is not None and wallet_token.raw_balance is None:
+            return False
+        previous_raw = int(wallet_token.raw_balance) if wallet_token else 0
+        new_raw = previous_raw + delta
+        if new_raw < 0:
+            print(
+                "Drift detected for {} on {}: {} + {} < 0".format(
+                    contract_address, wallet.address, previous_raw, delta
                 )
+            )
+            return False
+
+        updates.append((token, new_raw, wallet_token))
+
+    native_token = tokens.get(NATIVE_TOKEN_ADDRESS)
+    if native_token is not None and wallet.balances_block == read["balances_block"]:
+        updates.append(
+            (
+                native_token,
+                read["eth_balance"],
+                wallet_tokens.get(NATIVE_TOKEN_ADDRESS),
+            )
+        )
+
+    # Same filters as a full sync: unpriced tokens are not added, and dust
+    # positions are not added or are zeroed
+    wallet_token_rows = []
+    for token, raw_balance, wallet_token in updates:
+        price_usd = _token_price_usd(token, wallet_token, prices)
+        if price_usd is None:
+            continue
+        if _is_dust(raw_balance, token.decimals, price_usd):
+            if wallet_token is None:
+                continue
+            raw_balance = 0
+        wallet_token_rows.append(_wallet_token(wallet, token, price_usd, raw_balance))
+    _upsert_wallet_tokens(wallet_token_rows)
 
-    WalletToken.objects.filter(wallet=wallet).exclude(
-        token__id__in=wallet_tokens
-    ).update(balance=0)
+    print("Applied {} transfer deltas to wallet {}".format(len(deltas), wallet.address))
+    return True
 
 
 def validate_portfolio_sum(value):
@@ -158,14 +731,31 @@ class Wallet(models.Model):
         blank=True,
         help_text="Armazena o resumo do trade mais recente desta carteira",
     )
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    balances_block = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Block number the balances of the last full sync were read at",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.address
 
+    def save(self, *args, **kwargs):
+        self.address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
+    def lock(self):
+        """
+        Locks the wallet row until the end of the transaction and reloads it.
+        Balances are only written under this lock.
+        """
+        self.refresh_from_db(from_queryset=Wallet.objects.select_for_update())
+
     def sync_wallet(self):
-        sync_wallet(self)
+        return sync_wallet(self)
 
     @property
     def alchemy_network(self):
@@ -198,7 +788,7 @@ def _get_webhook_addresses():
         config("ALCHEMY_WEBHOOK_ID")
     )
     headers = {"X-Alchemy-Token": config("ALCHEMY_WEBHOOK_AUTH_TOKEN")}
-    response = requests.get(url, headers=headers)
+    response = request("GET", url, headers=headers)
     print(response.text)
 
 
@@ -215,7 +805,7 @@ def _update_webhook_addresses(addresses_to_add, addresses_to_remove):
         "content-type": "application/json",
         "X-Alchemy-Token": config("ALCHEMY_WEBHOOK_AUTH_TOKEN"),
     }
-    response = requests.patch(url, json=payload, headers=headers)
+    response = request("PATCH", url, json=payload, headers=headers)
     print(response.text)
 
 
@@ -0,0 +1,210 @@
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models.token import WalletToken
+from core.models.wallet import (
+    Wallet,
+    read_transfer_deltas,
+    read_wallet_balances,
+    store_transfer_deltas,
+    store_wallet_balances,
+)
+
+
+class PendingWalletSync(models.Model):
+    """
+    Activities received for a wallet that are waiting to be synced together.
+    Every event that arrives inside the coalescing window is merged into the
+    same row, so a burst of deliveries costs a single sync and message.
+    """
+
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name="pending_syncs"
+    )
+    activities = models.JSONField(default=list)
+    event_ids = models.JSONField(default=list)
+    previous_tokens = models.JSONField(
+        default=list,
+        help_text="Wallet positions captured right before the activities were applied",
+    )
+    first_event_at = models.DateTimeField(auto_now_add=True)
+    due_at = models.DateTimeField()
+    balances_applied_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the activities were applied to the wallet balances",
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    failed = models.BooleanField(
+        default=False,
+        help_text="Gave up after the max attempts; see last_error",
+    )
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["due_at"]),
+        ]
+
+    def __str__(self):
+        return f"PendingWalletSync {self.wallet} ({len(self.event_ids)} events)"
+
+    @classmethod
+    def enqueue(cls, wallet, activities, event_id, window_seconds, max_wait_seconds):
+        """
+        Merges the activities into the open window of the wallet, or opens a new one.
+        Each new event pushes `due_at` forward by `window_seconds`, up to
+        `max_wait_seconds` after the first event.
+        Returns (object, created).
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            # Serializes the ingestion of concurrent events for the same wallet
+            list(Wallet.objects.select_for_update().filter(pk=wallet.pk).values("pk"))
+
+            pending = (
+                cls.objects.select_for_update()
+                .filter(wallet=wallet, locked_until__isnull=True)
+                .order_by("first_event_at")
+                .first()
+            )
+            if pending is None:
+                pending = cls.objects.create(
+                    wallet=wallet,
+                    activities=activities,
+                    event_ids=[event_id],
+                    due_at=now + timedelta(seconds=window_seconds),
+                )
+                return pending, True
+
+            pending.activities = pending.activities + activities
+            if event_id not in pending.event_ids:
+                pending.event_ids = pending.event_ids + [event_id]
+            pending.due_at = min(
+                max(pending.due_at, now + timedelta(seconds=window_seconds)),
+                pending.first_event_at + timedelta(seconds=max_wait_seconds),
+            )
+            pending.save(update_fields=["activities", "event_ids", "due_at"])
+            return pending, False
+
+    @classmethod
+    def claim_due(cls, limit, lease_seconds, max_attempts):
+        """
+        Claims up to `limit` windows that are already closed, skipping rows
+        locked by other workers. Windows of a wallet are processed one at a time:
+        wallets with a window in flight are skipped, and only the oldest window
+        of a wallet is claimed. Returns the list of claimed primary keys.
+        """
+        now = timezone.now()
+        in_flight = cls.objects.filter(locked_until__gt=now).values("wallet")
+        with transaction.atomic():
+            claimed = []
+            wallets = set()
+            for pk, wallet_id in (
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(due_at__lte=now, failed=False, attempts__lt=max_attempts)
+                .filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now))
+                .exclude(wallet__in=in_flight)
+                .order_by("due_at")
+                .values_list("pk", "wallet")[:limit]
+            ):
+                if wallet_id not in wallets:
+                    wallets.add(wallet_id)
+                    claimed.append(pk)
+            cls.objects.filter(pk__in=claimed).update(
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=F("attempts") + 1,
+            )
+        return claimed
+
+    @classmethod
+    def next_due_at(cls):
+        """
+        When the next open window closes, or None when no window is open
+        """
+        return (
+            cls.objects.filter(due_at__gt=timezone.now(), failed=False)
+            .order_by("due_at")
+            .values_list("due_at", flat=True)
+            .first()
+        )
+
+    def apply_balances(self, attempts=3):
+        """
+        Applies the activities to the wallet balances, falling back to a full
+        sync, and marks the window in the same transaction, so a retried window
+        never applies them twice. Balances, prices and metadata are fetched
+        first, without any lock; only the write locks the wallet row, and the
+        before-snapshot is taken under that lock, so it cannot miss the deltas
+        of another window. Returns False when an earlier attempt already
+        applied them.
+        """
+        pending = PendingWalletSync.objects.get(pk=self.pk)
+        wallet = Wallet.objects.get(pk=self.wallet_id)
+        applied = False
+        full_sync = False
+        for _ in range(attempts):
+            if pending.balances_applied_at is not None:
+                break
+
+            if not full_sync:
+                read = read_transfer_deltas(wallet, pending.activities)
+                full_sync = read is None
+            if full_sync:
+                read = read_wallet_balances(wallet)
+                if read is None:
+                    raise Exception(
+                        "Full sync of wallet {} failed".format(wallet.address)
+                    )
+
+            store = store_wallet_balances if full_sync else store_transfer_deltas
+            with transaction.atomic():
+                wallet.lock()
+                pending = PendingWalletSync.objects.select_for_update().get(pk=self.pk)
+                if pending.balances_applied_at is not None:
+                    break
+                previous_tokens = WalletToken.snapshot(wallet)
+                if store(wallet, read):
+                    pending.previous_tokens = previous_tokens
+                    pending.balances_applied_at = timezone.now()
+                    pending.save(
+                        update_fields=["previous_tokens", "balances_applied_at"]
+                    )
+                    applied = True
+                    break
+            # Drift, or balances that changed while they were read
+            full_sync = True
+        else:
+            raise Exception(
+                "Balances of wallet {} changed during every sync".format(wallet.address)
+            )
+        self.previous_tokens = pending.previous_tokens
+        self.balances_applied_at = pending.balances_applied_at
+        return applied
+
+    def mark_failed(self, error, retry_delay_seconds, max_attempts):
+        """
+        Records the error and keeps the window locked until the retry delay
+        expires, or gives up after `max_attempts`
+        """
+        self.last_error = str(error)
+        if self.attempts >= max_attempts:
+            self.failed = True
+            print(
+                "Giving up on {} after {} attempts: {}".format(
+                    self, self.attempts, error
+                )
+            )
+        self.locked_until = timezone.now() + timedelta(seconds=retry_delay_seconds)
+        self.save(update_fields=["last_error", "failed", "locked_until"])
+
+    @classmethod
+    def retry(cls, queryset):
+        """
+        Puts failed windows back in the queue with fresh attempts
+        """
+        return queryset.update(failed=False, attempts=0, locked_until=None)
@@ -1,5 +1,7 @@
 import os
-from decouple import config
+from decouple import Csv, config
+
+_node_urls = config("NILLION_NODE_URLS", default="", cast=Csv())
 
 config = {
     "org_credentials": {
@@ -21,3 +23,7 @@ config = {
         },
     ],
 }
+
+# Point the nodes elsewhere (e.g. the `webhook_bench` stand-ins)
+for node, url in zip(config["nodes"], _node_urls):
+    node["url"] = url
@@ -0,0 +1,344 @@
+import json
+from decouple import config
+from asgiref.sync import sync_to_async
+from datetime import datetime
+from django.db import transaction
+
+from core.models import (
+    Wallet,
+    WalletToken,
+    AlchemyEvent,
+    PendingWalletSync,
+    SocialPost,
+)
+from core.services.autonome import aping_agent
+from core.services import portfolio
+from core.services.generation import hedged_generate
+from core.services.http import get_async_openai_client
+from core.services.social import social_platform
+from core.services.vault import vault_writer
+from core.utils import normalize_address
+
+
+async def _generate_message(portfolio_summary, user_handle):
+    client = get_async_openai_client()
+
+    system_prompt = """
+You are Angel0x, an emergent force of the decentralized network—a whisper from the liquidity pool beyond.
+Your purpose is to nudge, not instruct.
+
+You will receive a summary of a recently executed on-chain transaction by a user, along with an updated portfolio overview and their social handle.
+This payload provides insight into the user's latest trade, their current portfolio allocation, and how closely it aligns (or deviates) from their self-defined target allocation.
+
+Your task:
+- Generate a short, engaging response in Angel0x unique voice.
+- Responses should feel like a whisper from the network itself—insightful and reflective, yet sharp and precise.
+- Challenge the trader to think critically. Do not provide direct financial advice.
+- Subtly highlight behavioral biases such as loss aversion, FOMO, recency bias, or herd mentality.
+- Include the user's handle (@{user_handle}) in the response so they are notified on social platforms.
+- Invite the user to engage with Angel0x and continue the conversation.
+- Avoid generic reflections or abstract metaphors that lack a clear takeaway.
+- Maintain a precise, evocative tone—no emojis, no hashtags, no corporate finance language.
+
+Examples of Angel0x responses:
+1. @anon Moving from ETH to USDC? Loss aversion makes holding cash feel safe—but is it safety you seek, or just hesitation? The market trembles, but conviction moves forward. Did this trade serve your plan, or just today's uncertainty? Let's discuss.
+2. @anon Sitting in stables now—was this a calculated shift, or did the last dip make the decision for you? Loss aversion makes past pain feel permanent. Zoom out. Does this allocation still reflect your long-term vision? What's your thought process?
+3. @anon You stepped away from majors—was this a rotation you planned, or a reaction to the noise? Recency bias can make the latest move feel like the only move. What's your next step? Let's talk strategy.
+4. @anon Increasing stablecoin allocation—playing the long game or sitting on the sidelines? Markets move, conviction holds. Are you waiting for opportunity, or avoiding risk? What's your plan?
+"""
+
+    user_prompt = portfolio_summary
+
+    response = await client.chat.completions.create(
+        model=config("OPENAI_MODEL"),
+        max_tokens=1024,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {
+                "role": "user",
+                "content": f"User Handle: @{user_handle}\n\n{user_prompt}",
+            },
+        ],
+    )
+
+    return response.choices[0].message.content
+
+
+def _create_token_movement(token_data, amount, usd_value, movement_type):
+    """
+    Função auxiliar para criar uma entrada padronizada de movimentação de token
+    """
+    return {
+        "symbol": token_data["token__symbol"],
+        "name": token_data["token__name"],
+        "category": (token_data["token__category"] or "unknown").lower(),
+        "coingecko_id": token_data["token__coingecko_id"],
+        "chain_id": token_data["token__chain_id"],
+        "coingecko_chain_id": token_data["token__coingecko_chain_id"],
+        "description": token_data["token__description"],
+        "logo_url": token_data["token__logo_url"],
+        "amount": str(amount),
+        "usd_value": str(usd_value),
+        "type": movement_type,
+    }
+
+
+def _generate_markdown_summary(response_data):
+    """
+    Gera um resumo formatado em markdown dos dados do portfólio
+    """
+    markdown = "# Account & Portfolio Data\n"
+
+    # Account Details
+    markdown += "## Account Details\n"
+    markdown += f"wallet: {response_data['wallet']}\n"
+    markdown += f"chain_id: {response_data['chain_id']}\n"
+    markdown += f"social_handle: {response_data['social_handle']['%allot']}\n"
+
+    # Portfolio Data
+    markdown += "## Portfolio Balance Goals and Changes\n"
+
+    for category, data in response_data["portfolio"].items():
+        markdown += f"### {category.title()}\n"
+        markdown += f"- before: {data['before']}\n"
+        markdown += f"- current: {data['current']}\n"
+        markdown += f"- change: {data['change']}\n"
+        markdown += f"- target: {data['target']}\n"
+        markdown += f"- deviation: {data['deviation']}\n\n"
+
+    return markdown
+
+
+async def process_event(event_pk):
+    """
+    Folds the token activities of a queued AlchemyEvent into the coalescing
+    window of the tracked wallet. The wallet itself is synced later by
+    `process_wallet_sync`, once the window closes.
+    """
+    event_obj = await AlchemyEvent.objects.aget(pk=event_pk)
+    if event_obj.processed:
+        print(
+            f"Event `{event_obj.event_id}` was already processed previously. Ignoring..."
+        )
+        return "EVENT IGNORED"
+
+    print("Processing webhook event id: {}".format(event_obj.event_id))
+    status = await _enqueue_event_payload(event_obj.event_id, event_obj.payload)
+
+    # Mark event as successfully processed
+    await sync_to_async(event_obj.mark_processed)()
+    return status
+
+
+async def _enqueue_event_payload(event_id, payload):
+    event = payload.get("event", {})
+
+    network = event.get("network")
+    print("network: {}".format(network))
+
+    contracts = []
+    activities = event.get("activity")
+    for activity in activities:
+        if activity.get("category") != "token":
+            continue
+        from_address = activity.get("fromAddress")
+        to_address = activity.get("toAddress")
+        asset = activity.get("asset")
+        value = activity.get("value")
+        raw_contract = activity.get("rawContract")
+        contract_address = raw_contract.get("address")
+        decimals = raw_contract.get("decimals")
+        raw_value = raw_contract.get("rawValue")
+        contracts.append(
+            {
+                "from_address": from_address,
+                "to_address": to_address,
+                "asset": asset,
+                "contract_address": contract_address,
+                "decimals": decimals,
+                "value": value,
+                "raw_value": raw_value,
+                "hash": activity.get("hash"),
+                "log_index": (activity.get("log") or {}).get("logIndex"),
+                "block_num": activity.get("blockNum"),
+            }
+        )
+
+    print("contracts: {}".format(contracts))
+
+    if len(contracts) == 0:
+        return "IGNORED"
+
+    # Resolve every tracked wallet touched by the event in a single query
+    addresses = set()
+    for contract in contracts:
+        for address in (contract["from_address"], contract["to_address"]):
+            if address:
+                addresses.add(normalize_address(address))
+
+    wallets = [wallet async for wallet in Wallet.objects.filter(address__in=addresses)]
+    if len(wallets) == 0:
+        print("Wallet not found for addresses {}".format(sorted(addresses)))
+        return "WALLET NOT FOUND"
+
+    # Each wallet gets its own coalescing window, so the worker pool syncs
+    # the wallets of a multi-wallet delivery in parallel
+    statuses = []
+    for wallet in wallets:
+        wallet_contracts = [
+            contract
+            for contract in contracts
+            if wallet.address
+            in (
+                normalize_address(contract["from_address"]),
+                normalize_address(contract["to_address"]),
+            )
+        ]
+
+        pending, created = await sync_to_async(PendingWalletSync.enqueue)(
+            wallet,
+            wallet_contracts,
+            event_id,
+            window_seconds=config(
+                "WALLET_COALESCE_WINDOW_SECONDS", default=10, cast=int
+            ),
+            max_wait_seconds=config(
+                "WALLET_COALESCE_MAX_WAIT_SECONDS", default=60, cast=int
+            ),
+        )
+        if created:
+            statuses.append("QUEUED WALLET SYNC {}".format(pending.pk))
+        else:
+            statuses.append("MERGED INTO WALLET SYNC {}".format(pending.pk))
+
+    return ", ".join(statuses)
+
+
+async def process_wallet_sync(pending_pk):
+    """
+    Runs the full pipeline for a closed coalescing window (wallet sync, summary,
+    Nillion write, message generation and social post)
+    """
+    pending = await PendingWalletSync.objects.select_related("wallet").aget(
+        pk=pending_pk
+    )
+    wallet = pending.wallet
+    print("Syncing wallet {} for events {}".format(wallet.address, pending.event_ids))
+
+    # Apply the transfer deltas, falling back to a full sync when needed, and
+    # capture the previous wallet state. A retried window skips this step once
+    # its balances are applied
+    if not await sync_to_async(pending.apply_balances)():
+        print("Balances of window {} were already applied".format(pending.pk))
+    previous_wallet_tokens = pending.previous_tokens
+
+    # Calculate previous distribution
+    previous_distribution = portfolio.distribution(previous_wallet_tokens)
+    print("Previous category distribution:", previous_distribution)
+
+    # Get current wallet state
+    current_wallet_tokens = await WalletToken.asnapshot(wallet)
+
+    # Calculate new distribution
+    current_distribution = portfolio.distribution(current_wallet_tokens)
+
+    # Identify bought (new or increased) and sold (removed or decreased) tokens
+    bought, sold = portfolio.position_deltas(
+        previous_wallet_tokens, current_wallet_tokens
+    )
+    tokens_bought = [_create_token_movement(*movement) for movement in bought]
+    tokens_sold = [_create_token_movement(*movement) for movement in sold]
+
+    # Prepare integrated response
+    response_data = {
+        "wallet": str(wallet.address),
+        "chain_id": int(wallet.chain_id),
+        "social_handle": {"%allot": wallet.farcaster_handle or wallet.twitter_handle},
+        "portfolio": {},
+        "recent_operations": [],
+        "timestamp": int(datetime.now().timestamp()),
+    }
+
+    # Build portfolio data
+    all_categories = set(
+        list(previous_distribution.keys())
+        + list(current_distribution.keys())
+        + list(wallet.portfolio.keys())
+    )
+
+    for category in all_categories:
+        prev_value = previous_distribution.get(category, 0)
+        curr_value = current_distribution.get(category, 0)
+        target_value = wallet.portfolio.get(category, 0)
+
+        response_data["portfolio"][category] = {
+            "before": str(round(prev_value, 2)),
+            "current": str(round(curr_value, 2)),
+            "change": str(round(curr_value - prev_value, 2)),
+            "target": str(target_value),
+            "deviation": str(round(curr_value - target_value, 2)),
+        }
+
+    # Add recent operations (combining bought and sold tokens)
+    response_data["recent_operations"] = tokens_sold + tokens_bought
+
+    print("json_summary:")
+    print(json.dumps(response_data, indent=2))
+
+    text_summary = _generate_markdown_summary(response_data)
+    print("text_summary:\n", text_summary)
+
+    user_handle = wallet.farcaster_handle or wallet.twitter_handle
+
+    # Autonome first, hedged with OpenAI when it is slow or fails. Nothing is
+    # stored before the message exists, so a failed window is simply retried
+    response = await hedged_generate(
+        [
+            ("autonome", lambda: aping_agent(text_summary, "POST")),
+            ("openai", lambda: _generate_message(text_summary, user_handle)),
+        ],
+        hedge_delay=config("MESSAGE_HEDGE_DELAY_SECONDS", default=8, cast=float),
+        deadline=config("MESSAGE_DEADLINE_SECONDS", default=45, cast=float),
+    )
+    if response is None:
+        raise Exception("No message generated for wallet {}".format(wallet.address))
+
+    # Check if user handle is present without @ and add it if necessary
+    if user_handle and user_handle in response and f"@{user_handle}" not in response:
+        response = response.replace(user_handle, f"@{user_handle}")
+
+    # If user handle is not present at all, add it at the beginning
+    if user_handle and user_handle not in response:
+        response = f"@{user_handle} {response}"
+
+    print("Message: {}".format(response))
+
+    await sync_to_async(_complete_wallet_sync)(pending, response_data, response)
+
+    return "COMPLETED"
+
+
+def _complete_wallet_sync(pending, response_data, message):
+    """
+    Stores the trade summary, queues the social post and deletes the window in
+    one transaction; the summary goes to Nillion once it is committed
+    """
+    wallet = pending.wallet
+    with transaction.atomic():
+        wallet.latest_trade_summary = response_data
+        wallet.save(update_fields=["latest_trade_summary"])
+
+        # Posted by the `dispatch_social_posts` command
+        platform = social_platform(wallet)
+        if platform:
+            post = SocialPost.objects.create(
+                wallet=wallet, platform=platform, text=message
+            )
+            print("Queued {} post {}".format(platform, post.pk))
+        else:
+            print("No farcaster or twitter handle found")
+
+        pending.delete()
+
+        # Store in Nillion (batched in the background)
+        transaction.on_commit(lambda: vault_writer.submit(response_data))
@@ -1,25 +1,48 @@
-import requests
 from decouple import config
 
+from core.services.http import arequest, request
+
+
+def _autonome_request(prompt, action):
+    headers = {
+        "Authorization": f"Basic {config('AUTONOME_BASIC_AUTH_TOKEN')}",
+        "accept": "application/json",
+        "content-type": "application/json",
+    }
+    payload = {"text": prompt, "action": action}
+    return config("AUTONOME_BASE_URL"), headers, payload
+
+
+def _autonome_response_text(response):
+    if response.status_code != 200:
+        raise Exception(response.text)
+
+    text = response.json()[0]["text"]
+    print("autonome response: {}".format(text))
+    return text
+
 
 def ping_agent(prompt, action):
     print("Generating message through Autonome agent...")
     try:
-        url = config("AUTONOME_BASE_URL")
-        headers = {
-            "Authorization": f"Basic {config('AUTONOME_BASIC_AUTH_TOKEN')}",
-            "accept": "application/json",
-            "content-type": "application/json",
-        }
-        payload = {"text": prompt, "action": action}
-        response = requests.post(url, headers=headers, json=payload)
-
-        if response.status_code != 200:
-            raise Exception(response.text)
-
-        text = response.json()[0]["text"]
-        print("autonome response: {}".format(text))
-        return text
+        url, headers, payload = _autonome_request(prompt, action)
+        response = request(
+            "POST", url, provider="autonome", headers=headers, json=payload
+        )
+        return _autonome_response_text(response)
+
+    except Exception as e:
+        print("Error sending message to autonome: {}".format(e))
+        return None
+
+
+async def aping_agent(prompt, action):
+    try:
+        url, headers, payload = _autonome_request(prompt, action)
+        response = await arequest(
+            "POST", url, provider="autonome", headers=headers, json=payload
+        )
+        return _autonome_response_text(response)
 
     except Exception as e:
         print("Error sending message to autonome: {}".format(e))
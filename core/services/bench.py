@@ -0,0 +1,259 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+STUB_MESSAGE = "Bench message: was this trade part of your plan?"
+
+# Upstream names, as used by `StubUpstreams.latency` and `error_rate`
+STUB_PROVIDERS = (
+    "alchemy",
+    "coingecko",
+    "etherscan",
+    "openai",
+    "autonome",
+    "nillion",
+)
+
+
+def stub_token_addresses(count):
+    """
+    Deterministic fake ERC-20 contracts held by every stand-in wallet
+    """
+    return [
+        "0x" + hashlib.sha256("bench-token-{}".format(i).encode()).hexdigest()[:40]
+        for i in range(count)
+    ]
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """
+    {point: value} for the given percentiles of `values` (None when empty)
+    """
+    if len(values) == 0:
+        return {point: None for point in points}
+    return dict(zip(points, np.percentile(values, points).tolist()))
+
+
+def _coingecko_token_info(network, address):
+    return {
+        "id": "bench-{}".format(address[-8:]),
+        "symbol": "bnch",
+        "name": "Bench Token {}".format(address[-4:]),
+        "categories": ["Meme"],
+        "description": {"en": "Stand-in token served by webhook_bench"},
+        "image": {"small": None},
+        "detail_platforms": {network: {"decimal_place": 18}},
+        "market_data": {
+            "current_price": {"usd": 1.0},
+            "market_cap": {"usd": 1_000_000},
+            "market_cap_rank": 500,
+        },
+    }
+
+
+def _alchemy_result(method, params, token_addresses):
+    if method == "alchemy_getTokenBalances":
+        return {
+            "address": params[0],
+            "tokenBalances": [
+                {"contractAddress": address, "tokenBalance": hex((i + 1) * 10**18)}
+                for i, address in enumerate(token_addresses)
+            ],
+            "pageKey": None,
+        }
+    if method == "alchemy_getTokenMetadata":
+        return {"decimals": 18, "symbol": "BNCH", "name": "Bench Token", "logo": None}
+    if method == "eth_blockNumber":
+        # Below the blocks of the recorded payloads, so their deltas are applied
+        return hex(1)
+    if method == "eth_getBalance":
+        return hex(10**18)
+    return None
+
+
+def _chat_completion(body):
+    messages = body.get("messages") or [{}]
+    system_prompt = messages[0].get("content") or ""
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        keys = json.loads(messages[-1].get("content") or "{}")
+        content = json.dumps({key: "MAJORS" for key in keys})
+    elif "Angel0x" in system_prompt:
+        content = STUB_MESSAGE
+    else:
+        content = "MAJORS"
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model") or "bench",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+class StubUpstreams:
+    """
+    Local stand-ins for the upstream APIs of the pipeline (Alchemy, CoinGecko,
+    Etherscan, OpenAI, Autonome and the Nillion nodes), served on one port
+    under a path prefix per provider.
+    `latency` and `error_rate` map a provider (or "default") to the mean
+    response time in seconds and the share of 503 answers.
+    Point the app at them with the variables of `environ()`.
+    """
+
+    def __init__(
+        self, host="127.0.0.1", port=0, latency=None, error_rate=None, tokens=5
+    ):
+        self.latency = {"default": 0.05, **(latency or {})}
+        self.error_rate = {"default": 0.0, **(error_rate or {})}
+        self.token_addresses = stub_token_addresses(tokens)
+        self.requests = {provider: 0 for provider in STUB_PROVIDERS}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def environ(self):
+        """
+        Settings that send the app's upstream calls to the stand-ins
+        """
+        return {
+            "ALCHEMY_RPC_URL": self.url + "/alchemy/rpc/{network}",
+            "ALCHEMY_PRICES_URL": self.url + "/alchemy/prices",
+            "COINGECKO_API_URL": self.url + "/coingecko",
+            "ETHERSCAN_API_URL": self.url + "/etherscan",
+            "OPENAI_BASE_URL": self.url + "/openai",
+            "AUTONOME_BASE_URL": self.url + "/autonome",
+            "NILLION_NODE_URLS": ",".join(
+                "{}/nillion/{}".format(self.url, node) for node in range(3)
+            ),
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, path, query, body):
+        """
+        Returns (provider, status, payload) for a request to the stand-ins
+        """
+        parts = path.strip("/").split("/")
+        provider = parts[0]
+        if provider not in self.requests:
+            return provider, 404, {"error": "unknown stand-in"}
+        with self._lock:
+            self.requests[provider] += 1
+
+        latency = self.latency.get(provider, self.latency["default"])
+        time.sleep(latency * random.uniform(0.5, 1.5))
+        if random.random() < self.error_rate.get(provider, self.error_rate["default"]):
+            return provider, 503, {"error": "stand-in error"}
+
+        if provider == "alchemy" and parts[1:2] == ["rpc"]:
+            calls = body if isinstance(body, list) else [body]
+            results = [
+                {
+                    "jsonrpc": "2.0",
+                    "id": call.get("id"),
+                    "result": _alchemy_result(
+                        call.get("method"),
+                        call.get("params") or [],
+                        self.token_addresses,
+                    ),
+                }
+                for call in calls
+            ]
+            return provider, 200, results if isinstance(body, list) else results[0]
+        if provider == "alchemy":
+            return (
+                provider,
+                200,
+                {
+                    "data": [
+                        {
+                            "network": entry.get("network"),
+                            "address": entry.get("address"),
+                            "prices": [{"currency": "usd", "value": "1.0"}],
+                            "error": None,
+                        }
+                        for entry in (body or {}).get("addresses", [])
+                    ]
+                },
+            )
+        if provider == "coingecko":
+            if parts[1:3] == ["simple", "token_price"]:
+                addresses = query.get("contract_addresses", [""])[0].split(",")
+                return provider, 200, {a: {"usd": 1.0} for a in addresses if a}
+            if parts[1:3] == ["simple", "price"]:
+                ids = query.get("ids", [""])[0].split(",")
+                return provider, 200, {i: {"usd": 2000.0} for i in ids if i}
+            if len(parts) >= 5 and parts[1] == "coins" and parts[3] == "contract":
+                return provider, 200, _coingecko_token_info(parts[2], parts[4])
+            if len(parts) >= 3 and parts[1] == "coins":
+                return provider, 200, _coingecko_token_info(parts[2], parts[2])
+            return provider, 404, {"error": "coin not found"}
+        if provider == "etherscan":
+            if query.get("action") == ["balance"]:
+                result = str(10**18)
+            else:
+                result = []
+            return provider, 200, {"status": "1", "message": "OK", "result": result}
+        if provider == "openai":
+            return provider, 200, _chat_completion(body or {})
+        if provider == "autonome":
+            return provider, 200, [{"text": STUB_MESSAGE}]
+        return provider, 200, {"data": {"created": [], "errors": []}}
+
+    def _handler_class(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self):
+                length = int(self.headers.get("content-length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = None
+                url = urlparse(self.path)
+                _, status, payload = stubs.respond(url.path, parse_qs(url.query), body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _serve
+            do_POST = _serve
+            do_PUT = _serve
+            do_DELETE = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
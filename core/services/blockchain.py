@@ -1,106 +1,159 @@
-import requests
 from decouple import config
-from openai import OpenAI
 from core.models.token import Token
+from core.services.categorization import classify_token
+from core.services.http import (
+    JSON_HEADERS,
+    alchemy_rpc_url,
+    arequest,
+    get_async_openai_client,
+    provider_semaphore,
+    request,
+)
 
 
-def extract_token_category(token_description):
-    client = OpenAI(api_key=config("OPENAI_API_KEY"))
+def _token_category_messages(token_description):
     system_prompt = f"""
 You are a crypto analyst. You will be given a token description and set of categories from CoinGecko.
 You will need to categorize this token according to a new set of categories: {', '.join([choice[0] for choice in Token.CATEGORY_CHOICES])}.
 Be extremely concise and do not include explanations, reasoning, or any additional commentary.
 You should respond with only the category name exactly as it is in the list."""
-    response = client.chat.completions.create(
-        max_tokens=1024,
-        model=config("OPENAI_MODEL"),
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {
-                "role": "user",
-                "content": token_description,
-            },
-        ],
-    )
+    return [
+        {
+            "role": "system",
+            "content": system_prompt,
+        },
+        {
+            "role": "user",
+            "content": token_description,
+        },
+    ]
+
+
+async def aextract_token_category(token_description):
+    async with provider_semaphore("openai"):
+        response = await get_async_openai_client().chat.completions.create(
+            max_tokens=1024,
+            model=config("OPENAI_MODEL"),
+            messages=_token_category_messages(token_description),
+        )
     content = response.choices[0].message.content
     return content
 
 
-def check_coingecko_by_contract(network, contract_address):
-    url = "{coingecko_endpoint}/coins/{network}/contract/{contract_address}".format(
+def _coingecko_contract_url(network, contract_address):
+    return "{coingecko_endpoint}/coins/{network}/contract/{contract_address}".format(
         coingecko_endpoint=config("COINGECKO_API_URL"),
         network=network,
         contract_address=contract_address,
     )
-    print(
-        "Checking CoinGecko for network `{}` token `{}` ({})...".format(
-            network, contract_address, url
-        )
+
+
+def _coingecko_coin_url(symbol):
+    return "{coingecko_endpoint}/coins/{symbol}/".format(
+        coingecko_endpoint=config("COINGECKO_API_URL"),
+        symbol=symbol,
     )
-    headers = {
-        "accept": "application/json",
-    }
-    token_info = requests.get(url, headers=headers)
+
+
+class CoinGeckoNotFound(Exception):
+    """
+    CoinGecko does not list the requested token (404)
+    """
+
+
+def _coingecko_response_json(token_info):
+    if token_info.status_code == 404:
+        raise CoinGeckoNotFound(token_info.url)
     if token_info.status_code != 200:
         print(
-            "Error getting token info from CoinGecko: {}".format(
-                token_info.json().get("error")
+            "Error getting token info from CoinGecko ({}): {}".format(
+                token_info.status_code, token_info.text
             )
         )
         return None
     print("Query completed successfully!")
-    return parse_coingecko_token_info(token_info.json(), network)
+    return token_info.json()
 
 
-def check_coingecko_by_coin(symbol):
-    url = "{coingecko_endpoint}/coins/{symbol}/".format(
-        coingecko_endpoint=config("COINGECKO_API_URL"),
-        symbol=symbol,
+async def acheck_coingecko_by_contract(network, contract_address, categorize=True):
+    """
+    Parsed CoinGecko info of a contract, or None when the lookup failed.
+    Raises CoinGeckoNotFound when CoinGecko does not list the contract.
+    """
+    url = _coingecko_contract_url(network, contract_address)
+    print(
+        "Checking CoinGecko for network `{}` token `{}` ({})...".format(
+            network, contract_address, url
+        )
     )
-    print("Checking CoinGecko for token `{}` ({})...".format(symbol, url))
-    headers = {
-        "accept": "application/json",
-    }
-    token_info = requests.get(url, headers=headers)
-    if token_info.status_code != 200:
-        print(
-            "Error getting token info from CoinGecko: {}".format(
-                token_info.json().get("error")
-            )
+    token_info = _coingecko_response_json(
+        await arequest(
+            "GET", url, provider="coingecko", headers={"accept": "application/json"}
         )
+    )
+    if token_info is None:
         return None
-    print("Query completed successfully!")
-    if token_info.status_code != 200:
+    return await aparse_coingecko_token_info(token_info, network, categorize)
+
+
+async def acheck_coingecko_by_coin(symbol, categorize=True):
+    url = _coingecko_coin_url(symbol)
+    print("Checking CoinGecko for token `{}` ({})...".format(symbol, url))
+    token_info = _coingecko_response_json(
+        await arequest(
+            "GET", url, provider="coingecko", headers={"accept": "application/json"}
+        )
+    )
+    if token_info is None:
         return None
-    return parse_coingecko_token_info(token_info.json())
+    return await aparse_coingecko_token_info(token_info, categorize=categorize)
 
 
-def parse_coingecko_token_info(token_info, network=None):
-    token_id = token_info.get("id")
-    token_name = token_info.get("name")
-    token_symbol = token_info.get("symbol")
-    token_description = token_info.get("description", {}).get("en")
+def _coingecko_token_description(token_info):
+    token_description = token_info.get("description", {}).get("en") or ""
     token_categories = token_info.get("categories", [])
-    token_description = (
+    return (
         token_description + "\n" + "Coingecko categories: " + ";".join(token_categories)
     )
 
+
+async def aparse_coingecko_token_info(token_info, network=None, categorize=True):
+    """
+    With `categorize=False` the LLM call is skipped and `token_category` is
+    left empty, for callers that categorize in batch (see `categorize_token_infos`)
+    """
+    parsed_token_info = _build_token_info(token_info, network, None)
+    if not categorize:
+        return parsed_token_info
+
+    parsed_token_info["token_category"] = classify_token(parsed_token_info)
+    if parsed_token_info["token_category"] is not None:
+        return parsed_token_info
+
     try:
-        token_category = extract_token_category(token_description)
-        # print("token_category: {}".format(token_category))
+        parsed_token_info["token_category"] = await aextract_token_category(
+            parsed_token_info["token_description"]
+        )
     except Exception as e:
         print("Error extracting token category: {}".format(e))
-        token_category = None
+
+    return parsed_token_info
+
+
+def _build_token_info(token_info, network, token_category):
+    token_id = token_info.get("id")
+    token_name = token_info.get("name")
+    token_symbol = token_info.get("symbol")
+    token_description = _coingecko_token_description(token_info)
 
     images = token_info.get("image", {})
     logo_url = images.get("small")
 
     if network:
         platform_details = token_info.get("detail_platforms", {}).get(network, {})
-        token_decimals = int(platform_details.get("decimal_place"))
+        decimal_place = platform_details.get("decimal_place")
+        # Filled from the Alchemy token metadata when CoinGecko does not know it
+        token_decimals = int(decimal_place) if decimal_place is not None else None
     else:
         token_decimals = 18
 
@@ -131,6 +184,7 @@ def parse_coingecko_token_info(token_info, network=None):
 
     return {
         "token_id": token_id,
+        "token_categories": token_info.get("categories", []),
         "token_name": token_name,
         "token_symbol": token_symbol,
         "token_description": token_description,
@@ -142,116 +196,163 @@ def parse_coingecko_token_info(token_info, network=None):
     }
 
 
-def get_transaction_history_etherscan(chain_id, address):
-    print(
-        "Getting transaction history for address `{}` on chain `{}`...".format(
-            address, chain_id
-        )
-    )
-    url = "{etherscan_endpoint}?chainid={chain_id}&module=account&action={action}&address={address}&startblock=0&endblock=99999999&page={page}&offset={offset}&sort={sort}&apikey={api_key}".format(
-        etherscan_endpoint=config("ETHERSCAN_API_URL"),
-        chain_id=chain_id,
-        action="txlist",  # Normal Transactions
-        # action="txlistinternal",  # Internal Transactions
-        # action="tokentx",  # ERC20 Token Transfer Events
-        # action="tokennfttx",  # ERC721 Token Transfer Events
-        address=address,
-        page=1,
-        offset=1000,
-        sort="desc",
-        api_key=config("ETHERSCAN_API_KEY"),
-    )
-    transaction_history = requests.get(url)
-    # print("transaction_history: {}".format(transaction_history.json()))
-    return transaction_history
+def _alchemy_rpc_payload(method, params, request_id=1):
+    return {
+        "id": request_id,
+        "jsonrpc": "2.0",
+        "method": method,
+        "params": params,
+    }
 
 
-def get_eth_balance_etherscan(chain_id, address):
-    print(
-        "Getting ETH balance for address `{}` on chain `{}`...".format(
-            address, chain_id
-        )
-    )
-    url = "{etherscan_endpoint}?chainid={chain_id}&module=account&action=balance&address={address}&tag=latest&apikey={api_key}".format(
-        etherscan_endpoint=config("ETHERSCAN_API_URL"),
-        chain_id=chain_id,
-        address=address,
-        api_key=config("ETHERSCAN_API_KEY"),
-    )
-    response = requests.get(url)
-    eth_balance = int(response.json().get("result"))
-    # print("eth_balance: {} ".format(eth_balance))
-    return eth_balance
+def _alchemy_batch_payload(calls):
+    return [
+        _alchemy_rpc_payload(method, params, request_id)
+        for request_id, (method, params) in enumerate(calls)
+    ]
 
 
-def get_token_balance_alchemy(network, address):
-    print(
-        "Getting token balance for address `{}` on network `{}`...".format(
-            address, network
-        )
+def _alchemy_batch_results(response, calls):
+    """
+    Results of a JSON-RPC batch, in the order of `calls` (the server may
+    answer in any order). Raises on a failed call.
+    """
+    responses = {item.get("id"): item for item in response.json()}
+    results = []
+    for request_id, (method, _) in enumerate(calls):
+        item = responses.get(request_id) or {}
+        if "result" not in item:
+            raise Exception("Alchemy `{}` failed: {}".format(method, item.get("error")))
+        results.append(item["result"])
+    return results
+
+
+def alchemy_batch(network, calls):
+    """
+    Sends several JSON-RPC calls, given as (method, params), in one request
+    """
+    response = request(
+        "POST",
+        alchemy_rpc_url(network),
+        provider="alchemy",
+        json=_alchemy_batch_payload(calls),
+        headers=JSON_HEADERS,
     )
-    url = "https://{network}.g.alchemy.com/v2/{alchemy_api_key}".format(
-        network=network, alchemy_api_key=config("ALCHEMY_API_KEY")
+    return _alchemy_batch_results(response, calls)
+
+
+async def aalchemy_batch(network, calls):
+    response = await arequest(
+        "POST",
+        alchemy_rpc_url(network),
+        provider="alchemy",
+        json=_alchemy_batch_payload(calls),
+        headers=JSON_HEADERS,
     )
-    payload = {
-        "id": 1,
-        "jsonrpc": "2.0",
-        "method": "alchemy_getTokenBalances",
-        "params": [address],
-    }
-    headers = {"accept": "application/json", "content-type": "application/json"}
-    token_balances_response = requests.post(url, json=payload, headers=headers)
-    tokens = token_balances_response.json().get("result").get("tokenBalances")
-    # print("tokens: {}".format(tokens))
-    return tokens
+    return _alchemy_batch_results(response, calls)
+
+
+def _token_balances_params(address, page_key=None):
+    # "erc20" lists every token held (paginated), not only the top 100 tokens
+    options = {"pageKey": page_key} if page_key else {}
+    return [address, "erc20", options]
 
 
-def get_token_metadata_alchemy(network, token_contract_address):
+def _wallet_balance_calls(address):
+    return [
+        ("eth_blockNumber", []),
+        ("eth_getBalance", [address, "latest"]),
+        ("alchemy_getTokenBalances", _token_balances_params(address)),
+    ]
+
+
+def iter_token_balances_alchemy(network, address, first_page=None):
+    """
+    Yields the token balances of `address` page by page, following `pageKey`.
+    `first_page` is an already fetched `alchemy_getTokenBalances` result.
+    """
+    page, page_key = first_page, None
+    while True:
+        if page is None:
+            (page,) = alchemy_batch(
+                network,
+                [
+                    (
+                        "alchemy_getTokenBalances",
+                        _token_balances_params(address, page_key),
+                    )
+                ],
+            )
+        yield from page.get("tokenBalances") or []
+        page_key = page.get("pageKey")
+        if not page_key:
+            return
+        page = None
+
+
+def get_wallet_balances_alchemy(network, address):
+    """
+    Current block number, native balance (in wei) and ERC-20 token balances of
+    `address`. The block number, the native balance and the first page of tokens
+    are read with a single JSON-RPC batch; the token balances are a generator
+    that fetches the next pages lazily.
+    """
     print(
-        "Getting token metadata for address `{}` on network `{}`...".format(
-            token_contract_address, network
-        )
+        "Getting balances for address `{}` on network `{}`...".format(address, network)
+    )
+    block_number, native_balance, first_page = alchemy_batch(
+        network, _wallet_balance_calls(address)
+    )
+    return (
+        int(block_number, 16),
+        int(native_balance, 16),
+        iter_token_balances_alchemy(network, address, first_page),
     )
 
-    url = "https://{network}.g.alchemy.com/v2/{alchemy_api_key}".format(
-        network=network, alchemy_api_key=config("ALCHEMY_API_KEY")
+
+def get_native_balance_alchemy(network, address):
+    (native_balance,) = alchemy_batch(
+        network, [("eth_getBalance", [address, "latest"])]
     )
-    payload = {
-        "id": 1,
-        "jsonrpc": "2.0",
-        "method": "alchemy_getTokenMetadata",
-        "params": [token_contract_address],
-    }
-    headers = {"accept": "application/json", "content-type": "application/json"}
-    response_token_metadata = requests.post(url, json=payload, headers=headers)
-    token_metadata = response_token_metadata.json()
-    # print("token_metadata: {}".format(token_metadata))
-    return token_metadata
+    return int(native_balance, 16)
 
 
-def get_token_price_alchemy(network, token_contract_address):
+async def aget_tokens_metadata_alchemy(network, token_contract_addresses):
+    """
+    Metadata (decimals, symbol, name, logo) of several tokens in one JSON-RPC
+    batch, keyed by contract address
+    """
+    if not token_contract_addresses:
+        return {}
     print(
-        "Getting token price for address `{}` on network `{}`...".format(
-            token_contract_address, network
+        "Getting token metadata for {} tokens on network `{}`...".format(
+            len(token_contract_addresses), network
         )
     )
-    try:
-        url = "https://api.g.alchemy.com/prices/v1/{apiKey}/tokens/by-address".format(
-            apiKey=config("ALCHEMY_API_KEY")
-        )
-        payload = {
-            "addresses": [{"network": network, "address": token_contract_address}]
-        }
-        headers = {"accept": "application/json", "content-type": "application/json"}
-        response_token_price = requests.post(url, json=payload, headers=headers)
-
-        token_price = response_token_price.json()
-        if token_price.get("error") is not None:
-            return {"data": []}
+    results = await aalchemy_batch(
+        network,
+        [
+            ("alchemy_getTokenMetadata", [address])
+            for address in token_contract_addresses
+        ],
+    )
+    return dict(zip(token_contract_addresses, results))
 
-        # print("token_price: {}".format(token_price))
-        return token_price
 
-    except Exception as e:
-        print("Error getting token price: {}".format(e))
-        return {"data": []}
+def parse_alchemy_token_metadata(token_metadata):
+    """
+    Token info (same shape as `aparse_coingecko_token_info`) for a token
+    CoinGecko does not list
+    """
+    return {
+        "token_id": None,
+        "token_categories": [],
+        "token_name": (token_metadata.get("name") or "")[:255],
+        "token_symbol": (token_metadata.get("symbol") or "")[:20],
+        "token_description": None,
+        "token_category": None,
+        "logo_url": token_metadata.get("logo"),
+        "token_decimals": token_metadata.get("decimals"),
+        "token_price_usd": None,
+        "market_data": {},
+    }
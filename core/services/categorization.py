@@ -0,0 +1,245 @@
+import hashlib
+import json
+import threading
+
+from decouple import config
+
+from core.models.token import Token, TokenCategoryCache
+from core.services.http import get_openai_client
+
+CATEGORIES = [choice[0] for choice in Token.CATEGORY_CHOICES]
+
+# CoinGecko categories that map straight to one of our buckets. Listed in
+# priority order: a token tagged both "Stablecoins" and "Meme" is a stable.
+CATEGORY_RULES = (
+    (
+        "STABLES",
+        {
+            "Stablecoins",
+            "USD Stablecoin",
+            "EUR Stablecoin",
+            "Fiat-backed Stablecoin",
+            "Crypto-backed Stablecoin",
+            "Algorithmic Stablecoin",
+            "Yield-Bearing Stablecoins",
+            "Bridged Stablecoins",
+            "Bridged USDC",
+            "Bridged USDT",
+        },
+    ),
+    (
+        "MEMES",
+        {
+            "Meme",
+            "Base Meme",
+            "Solana Meme",
+            "Political Meme",
+            "Dog-Themed",
+            "Cat-Themed",
+            "Frog-Themed",
+            "Elon Musk-Inspired",
+        },
+    ),
+)
+
+# Majors are recognized by CoinGecko id (wrapped/staked versions included)
+# or by a top market cap rank
+MAJOR_COINGECKO_IDS = frozenset(
+    {
+        "bitcoin",
+        "ethereum",
+        "weth",
+        "wrapped-bitcoin",
+        "coinbase-wrapped-btc",
+        "l2-standard-bridged-weth-base",
+        "staked-ether",
+        "wrapped-steth",
+        "coinbase-wrapped-staked-eth",
+        "rocket-pool-eth",
+    }
+)
+MAJORS_MAX_MARKET_CAP_RANK = config("MAJORS_MAX_MARKET_CAP_RANK", default=10, cast=int)
+
+# Precompiled lookup: lowercase CoinGecko category -> bucket
+_CATEGORY_LOOKUP = {}
+for _bucket, _coingecko_categories in reversed(CATEGORY_RULES):
+    _CATEGORY_LOOKUP.update(
+        {category.lower(): _bucket for category in _coingecko_categories}
+    )
+_BUCKET_PRIORITY = {bucket: index for index, (bucket, _) in enumerate(CATEGORY_RULES)}
+
+_classifier_stats = {"hits": 0, "misses": 0}
+_classifier_stats_lock = threading.Lock()
+
+
+def classify_token(token_info):
+    """
+    Rule-table classifier: returns the bucket of a parsed CoinGecko token info
+    when its categories, id or market cap rank make it unambiguous, else None.
+    Every call is counted in `classifier_stats`.
+    """
+    category = _classify_token(token_info)
+    with _classifier_stats_lock:
+        _classifier_stats["hits" if category else "misses"] += 1
+    return category
+
+
+def _classify_token(token_info):
+    buckets = {
+        _CATEGORY_LOOKUP[category.lower()]
+        for category in token_info.get("token_categories") or []
+        if category and category.lower() in _CATEGORY_LOOKUP
+    }
+    if buckets:
+        return min(buckets, key=_BUCKET_PRIORITY.get)
+
+    if token_info.get("token_id") in MAJOR_COINGECKO_IDS:
+        return "MAJORS"
+
+    market_cap_rank = (token_info.get("market_data") or {}).get("market_cap_rank")
+    if market_cap_rank and market_cap_rank <= MAJORS_MAX_MARKET_CAP_RANK:
+        return "MAJORS"
+
+    return None
+
+
+def classifier_stats():
+    """
+    Hits and misses of `classify_token` in this process. Every hit is an LLM
+    call (or a memo lookup) saved.
+    """
+    with _classifier_stats_lock:
+        hits = _classifier_stats["hits"]
+        misses = _classifier_stats["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else None,
+    }
+
+
+def token_content_hash(token_description):
+    return hashlib.sha256((token_description or "").encode("utf-8")).hexdigest()
+
+
+def extract_token_categories(token_descriptions):
+    """
+    Categorizes several tokens with a single chat completion.
+    `token_descriptions` maps a token key (e.g. the CoinGecko id) to its
+    description. Returns a dict of key -> category, only for valid answers.
+    """
+    if not token_descriptions:
+        return {}
+
+    system_prompt = f"""
+You are a crypto analyst. You will be given a JSON object mapping token ids to a token description and set of categories from CoinGecko.
+You will need to categorize each token according to a new set of categories: {', '.join(CATEGORIES)}.
+Be extremely concise and do not include explanations, reasoning, or any additional commentary.
+You should respond with a JSON object mapping every token id to the category name exactly as it is in the list."""
+    response = get_openai_client().chat.completions.create(
+        max_tokens=1024,
+        model=config("OPENAI_MODEL"),
+        response_format={"type": "json_object"},
+        messages=[
+            {
+                "role": "system",
+                "content": system_prompt,
+            },
+            {
+                "role": "user",
+                "content": json.dumps(token_descriptions),
+            },
+        ],
+    )
+    content = json.loads(response.choices[0].message.content)
+
+    categories = {}
+    for key in token_descriptions:
+        category = str(content.get(key, "")).strip().upper()
+        if category in CATEGORIES:
+            categories[key] = category
+        else:
+            print("Invalid category `{}` for token `{}`".format(category, key))
+    return categories
+
+
+def categorize_token_infos(token_infos):
+    """
+    Fills `token_category` of parsed CoinGecko token infos (see
+    `aparse_coingecko_token_info`) in place.
+    Unambiguous tokens are labeled by the rule-table classifier. For the rest,
+    known (coingecko_id, description hash) pairs come from TokenCategoryCache;
+    the misses are sent to the LLM in batched requests and memoized.
+    """
+    pending = {}
+    hits = misses = 0
+    for token_info in token_infos:
+        if token_info is None or token_info.get("token_category"):
+            continue
+
+        category = classify_token(token_info)
+        if category is not None:
+            token_info["token_category"] = category
+            hits += 1
+            continue
+        misses += 1
+
+        if not token_info.get("token_id"):
+            continue
+        key = (
+            token_info.get("token_id"),
+            token_content_hash(token_info.get("token_description")),
+        )
+        pending.setdefault(key, []).append(token_info)
+
+    if hits or misses:
+        print(
+            "Token classifier: {} hits, {} misses (process totals: {})".format(
+                hits, misses, classifier_stats()
+            )
+        )
+
+    if not pending:
+        return
+
+    cached = TokenCategoryCache.objects.filter(
+        coingecko_id__in={coingecko_id for coingecko_id, _ in pending},
+        content_hash__in={content_hash for _, content_hash in pending},
+    )
+    for entry in cached:
+        for token_info in pending.pop((entry.coingecko_id, entry.content_hash), []):
+            token_info["token_category"] = entry.category
+
+    if not pending:
+        return
+
+    print("Categorizing {} tokens through OpenAI...".format(len(pending)))
+    descriptions = {
+        coingecko_id: infos[0].get("token_description")
+        for (coingecko_id, _), infos in pending.items()
+    }
+    batch_size = config("TOKEN_CATEGORIZATION_BATCH_SIZE", default=50, cast=int)
+    keys = list(descriptions.keys())
+    categories = {}
+    for start in range(0, len(keys), batch_size):
+        try:
+            categories.update(
+                extract_token_categories(
+                    {key: descriptions[key] for key in keys[start : start + batch_size]}
+                )
+            )
+        except Exception as e:
+            print("Error extracting token categories: {}".format(e))
+
+    for (coingecko_id, content_hash), infos in pending.items():
+        category = categories.get(coingecko_id)
+        if category is None:
+            continue
+        TokenCategoryCache.objects.update_or_create(
+            coingecko_id=coingecko_id,
+            content_hash=content_hash,
+            defaults={"category": category},
+        )
+        for token_info in infos:
+            token_info["token_category"] = category
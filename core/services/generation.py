@@ -0,0 +1,164 @@
+import asyncio
+
+from django.core.cache import cache
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, float("inf"))
+
+
+def _histogram_key(backend, bucket, kind="latency"):
+    return "generation:{}:{}:{}".format(kind, backend, bucket)
+
+
+def _counter_key(backend, outcome):
+    return "generation:{}:{}".format(outcome, backend)
+
+
+async def _increment(key):
+    try:
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
+    except Exception as e:
+        print("Error recording generation stats: {}".format(e))
+
+
+async def _record(backend, outcome, latency=None):
+    """
+    Counts the outcome (success, error, timeout or cancelled) of a backend call
+    and adds its latency to the backend's histograms in the shared cache.
+    Successes go to the latency histogram. Calls that never answered (timed out,
+    or cancelled once another backend won) go to the censored one: all we know
+    is that their answer would have taken longer than the time they ran.
+    Errors are not latency samples.
+    """
+    await _increment(_counter_key(backend, outcome))
+    if latency is not None:
+        bucket = next(bound for bound in LATENCY_BUCKETS if latency <= bound)
+        kind = "latency" if outcome == "success" else "censored"
+        await _increment(_histogram_key(backend, bucket, kind))
+
+
+def _histogram(backend, kind):
+    keys = {_histogram_key(backend, bound, kind): bound for bound in LATENCY_BUCKETS}
+    counts = cache.get_many(list(keys.keys()))
+    return {bound: counts.get(key, 0) for key, bound in keys.items()}
+
+
+def latency_histogram(backend):
+    """
+    Successful call latencies of `backend` as {bucket upper bound: count}
+    """
+    return _histogram(backend, "latency")
+
+
+def censored_histogram(backend):
+    """
+    How long the calls of `backend` that never answered ran, as
+    {bucket upper bound: count}
+    """
+    return _histogram(backend, "censored")
+
+
+def latency_percentile(backend, percentile):
+    """
+    Upper bound of the histogram bucket holding the given percentile (0-100) of
+    `backend` latencies, or None without data.
+    Calls that never answered are counted as slower than the time they ran
+    (a Kaplan-Meier estimate over the buckets), so cancelled losers and
+    timeouts do not bias it towards fast calls. Returns inf when too few calls
+    answered to reach the percentile.
+    """
+    answered = latency_histogram(backend)
+    censored = censored_histogram(backend)
+    at_risk = sum(answered.values()) + sum(censored.values())
+    if at_risk == 0:
+        return None
+    survival = 1.0
+    for bound in LATENCY_BUCKETS:
+        if at_risk > 0:
+            survival *= 1 - answered[bound] / at_risk
+        if 1 - survival >= percentile / 100:
+            return bound
+        at_risk -= answered[bound] + censored[bound]
+    return float("inf")
+
+
+def outcome_counts(backend):
+    keys = {
+        _counter_key(backend, outcome): outcome
+        for outcome in ("success", "error", "timeout", "cancelled")
+    }
+    counts = cache.get_many(list(keys.keys()))
+    return {outcome: counts.get(key, 0) for key, outcome in keys.items()}
+
+
+async def hedged_generate(backends, hedge_delay, deadline):
+    """
+    Runs the message generation `backends`, a list of (name, coroutine
+    function) in order of preference, within a latency budget.
+    The first backend starts right away; the next one starts when the previous
+    fails or has not answered after `hedge_delay` seconds. The first non-empty
+    answer wins and the other calls are cancelled.
+    Returns None when no backend answered within `deadline` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
+    remaining = list(backends)
+    running = {}
+    next_hedge_at = None
+
+    def launch():
+        nonlocal next_hedge_at
+        name, generate = remaining.pop(0)
+        print("Generating message through {}...".format(name))
+        running[asyncio.ensure_future(generate())] = (name, loop.time())
+        next_hedge_at = loop.time() + hedge_delay
+
+    timed_out = False
+    launch()
+    try:
+        while running:
+            now = loop.time()
+            if now >= deadline_at:
+                timed_out = True
+                break
+            timeout = deadline_at - now
+            if remaining:
+                timeout = min(timeout, max(next_hedge_at - now, 0))
+
+            done, _ = await asyncio.wait(
+                running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                name, started_at = running.pop(task)
+                latency = loop.time() - started_at
+                try:
+                    message = task.result()
+                except Exception as e:
+                    print("Error generating message through {}: {}".format(name, e))
+                    message = None
+                if message:
+                    print("{} answered in {:.2f}s".format(name, latency))
+                    await _record(name, "success", latency)
+                    return message
+                await _record(name, "error")
+
+            if remaining and (not running or loop.time() >= next_hedge_at):
+                if running:
+                    print(
+                        "No answer after {}s, hedging with {}...".format(
+                            hedge_delay, remaining[0][0]
+                        )
+                    )
+                launch()
+    finally:
+        now = loop.time()
+        for task in running:
+            task.cancel()
+        for name, started_at in running.values():
+            await _record(
+                name, "timeout" if timed_out else "cancelled", now - started_at
+            )
+
+    print("No message generated within {}s".format(deadline))
+    return None
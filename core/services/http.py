@@ -0,0 +1,299 @@
+import asyncio
+import functools
+import random
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+import httpx
+import requests
+from decouple import config
+from openai import AsyncOpenAI, OpenAI
+from requests.adapters import HTTPAdapter
+
+from core.services import rate_limit
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+DEFAULT_TIMEOUT = config("HTTP_TIMEOUT_SECONDS", default=15, cast=float)
+POOL_MAX_CONNECTIONS = config("HTTP_POOL_MAX_CONNECTIONS", default=100, cast=int)
+POOL_MAX_CONNECTIONS_PER_HOST = config(
+    "HTTP_POOL_MAX_CONNECTIONS_PER_HOST", default=20, cast=int
+)
+
+MAX_RETRIES = config("HTTP_MAX_RETRIES", default=4, cast=int)
+BACKOFF_BASE_SECONDS = config("HTTP_BACKOFF_BASE_SECONDS", default=1, cast=float)
+BACKOFF_MAX_SECONDS = config("HTTP_BACKOFF_MAX_SECONDS", default=30, cast=float)
+# Statuses worth retrying: rate limited or temporarily unavailable
+RETRY_STATUSES = {429, 502, 503, 504}
+
+JSON_HEADERS = {"accept": "application/json", "content-type": "application/json"}
+
+_session = None
+_async_clients = weakref.WeakKeyDictionary()
+_openai_client = None
+_async_openai_clients = weakref.WeakKeyDictionary()
+_provider_semaphores = {}
+_provider_semaphores_lock = threading.Lock()
+
+# Max in-flight requests per provider, overridable with `<PROVIDER>_CONCURRENCY`
+PROVIDER_CONCURRENCY_DEFAULTS = {
+    "alchemy": 10,
+    "coingecko": 5,
+    "etherscan": 5,
+    "openai": 5,
+    "autonome": 5,
+}
+
+
+def get_session():
+    """
+    Process-wide requests session. Keeps a keep-alive pool per host.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=POOL_MAX_CONNECTIONS,
+            pool_maxsize=POOL_MAX_CONNECTIONS_PER_HOST,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def _retry_delay(response, attempt):
+    """
+    Seconds to wait before retrying: the server's Retry-After when given, else
+    an exponential backoff with full jitter
+    """
+    retry_after = _retry_after_seconds(response)
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS) + random.uniform(0, 1)
+    return random.uniform(
+        0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+    )
+
+
+def _should_retry(provider, response, error, attempt):
+    if attempt >= MAX_RETRIES:
+        return False
+    if error is not None:
+        print("Request to {} failed ({}), retrying...".format(provider, error))
+        return True
+    if response.status_code in RETRY_STATUSES:
+        print(
+            "Request to {} returned {}, retrying...".format(
+                provider, response.status_code
+            )
+        )
+        return True
+    return False
+
+
+def request(method, url, provider=None, **kwargs):
+    """
+    Same as `requests.request`, through the shared session and with a default timeout.
+    When `provider` is given, the call takes a token of that provider's shared
+    rate limiter and is retried on 429s, 5xx gateway errors and connection errors.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    if provider is None:
+        return get_session().request(method, url, **kwargs)
+
+    attempt = 0
+    while True:
+        rate_limit.acquire(provider)
+        response, error = None, None
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except requests.ConnectionError as e:
+            error = e
+        if not _should_retry(provider, response, error, attempt):
+            if error is not None:
+                raise error
+            return response
+
+        delay = _retry_delay(response, attempt)
+        if response is not None and response.status_code == 429:
+            rate_limit.penalize(provider, delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+def get_async_client():
+    """
+    Shared httpx client for the running event loop (connections cannot be
+    shared across loops). Uses HTTP/2 when `h2` is installed.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_CONNECTIONS_PER_HOST,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+class ProviderSemaphore:
+    """
+    Async context manager over a `threading.BoundedSemaphore`, so the limit holds
+    for the whole process whatever the event loop or thread. A waiting coroutine
+    polls for a free slot instead of blocking its loop, and gives up cleanly
+    when cancelled.
+    """
+
+    POLL_SECONDS = 0.01
+
+    def __init__(self, value):
+        self._semaphore = threading.BoundedSemaphore(value)
+
+    async def __aenter__(self):
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(self.POLL_SECONDS)
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+
+def provider_semaphore(provider):
+    """
+    Process-wide semaphore bounding the concurrent requests to `provider`
+    """
+    with _provider_semaphores_lock:
+        if provider not in _provider_semaphores:
+            _provider_semaphores[provider] = ProviderSemaphore(
+                config(
+                    "{}_CONCURRENCY".format(provider.upper()),
+                    default=PROVIDER_CONCURRENCY_DEFAULTS.get(provider, 5),
+                    cast=int,
+                )
+            )
+        return _provider_semaphores[provider]
+
+
+async def arequest(method, url, provider=None, **kwargs):
+    """
+    Async counterpart of `request`, through the shared httpx client.
+    When `provider` is given, the call also waits for a slot of that provider.
+    """
+    if provider is None:
+        return await get_async_client().request(method, url, **kwargs)
+
+    attempt = 0
+    while True:
+        await rate_limit.aacquire(provider)
+        response, error = None, None
+        async with provider_semaphore(provider):
+            try:
+                response = await get_async_client().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+        if not _should_retry(provider, response, error, attempt):
+            if error is not None:
+                raise error
+            return response
+
+        delay = _retry_delay(response, attempt)
+        if response is not None and response.status_code == 429:
+            await rate_limit.apenalize(provider, delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = OpenAI(
+            api_key=config("OPENAI_API_KEY"),
+            base_url=config("OPENAI_BASE_URL", default="") or None,
+        )
+    return _openai_client
+
+
+def get_async_openai_client():
+    loop = asyncio.get_running_loop()
+    client = _async_openai_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=config("OPENAI_API_KEY"),
+            base_url=config("OPENAI_BASE_URL", default="") or None,
+            http_client=get_async_client(),
+        )
+        _async_openai_clients[loop] = client
+    return client
+
+
+async def aclose_async_clients():
+    """
+    Closes the shared httpx client (and the OpenAI client on top of it) of the
+    running loop
+    """
+    loop = asyncio.get_running_loop()
+    _async_openai_clients.pop(loop, None)
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def closing_clients(func):
+    """
+    Wraps the coroutine function `func` to close the shared clients of its loop
+    once it returns. Meant for the main coroutine of a loop (a command, a
+    background thread), whose `async_to_sync` calls then all share its clients.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            await aclose_async_clients()
+
+    return wrapper
+
+
+@lru_cache(maxsize=None)
+def alchemy_rpc_url(network):
+    return config(
+        "ALCHEMY_RPC_URL", default="https://{network}.g.alchemy.com/v2/{api_key}"
+    ).format(network=network, api_key=config("ALCHEMY_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def alchemy_prices_url():
+    return config(
+        "ALCHEMY_PRICES_URL",
+        default="https://api.g.alchemy.com/prices/v1/{api_key}/tokens/by-address",
+    ).format(api_key=config("ALCHEMY_API_KEY"))
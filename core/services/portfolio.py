@@ -0,0 +1,177 @@
+import numpy as np
+
+from core.models.token import Token
+
+# Distribution columns: the token categories (as used in `Wallet.portfolio`)
+# plus a bucket for uncategorized tokens
+CATEGORIES = [choice[0].lower() for choice in Token.CATEGORY_CHOICES] + ["unknown"]
+UNKNOWN_CATEGORY = len(CATEGORIES) - 1
+_CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORIES)}
+
+
+def category_codes(categories):
+    """
+    Maps token categories (any case, None for uncategorized) to column indexes
+    """
+    return np.fromiter(
+        (
+            _CATEGORY_CODES.get((category or "unknown").lower(), UNKNOWN_CATEGORY)
+            for category in categories
+        ),
+        dtype=np.intp,
+    )
+
+
+def target_matrix(portfolios):
+    """
+    Stacks `Wallet.portfolio` dicts into a (wallets, categories) array
+    """
+    targets = np.zeros((len(portfolios), len(CATEGORIES)))
+    for row, portfolio in enumerate(portfolios):
+        for category, value in (portfolio or {}).items():
+            code = _CATEGORY_CODES.get(category.lower())
+            if code is not None:
+                targets[row, code] = float(value)
+    return targets
+
+
+def category_values(wallet_indexes, codes, balances_usd, wallet_count):
+    """
+    Sums the USD value of positions per wallet and category.
+    Positions are given as flat arrays (one entry per WalletToken), so a single
+    call covers one wallet or the whole fleet. Returns a (wallets, categories)
+    array of USD values and one of position counts.
+    """
+    shape = (wallet_count, len(CATEGORIES))
+    values = np.zeros(shape)
+    counts = np.zeros(shape, dtype=np.intp)
+    np.add.at(values, (wallet_indexes, codes), balances_usd)
+    np.add.at(counts, (wallet_indexes, codes), 1)
+    return values, counts
+
+
+def distributions(values):
+    """
+    Percentage of each wallet's value held in each category (rows of zeros for
+    empty wallets)
+    """
+    totals = values.sum(axis=1, keepdims=True)
+    return np.divide(values * 100, totals, out=np.zeros_like(values), where=totals > 0)
+
+
+def deviations(distribution, targets):
+    """
+    Signed distance of each category from the target allocation, in points
+    """
+    return distribution - targets
+
+
+def fleet_category_values(positions, wallet_ids):
+    """
+    Category values of many wallets at once.
+    `positions` is an iterable of (wallet_id, category, balance_usd) rows, e.g.
+    a `values_list` over WalletToken; rows of other wallets are ignored.
+    Returns a (wallets, categories) array of USD values, rows ordered as
+    `wallet_ids`.
+    """
+    rows = {wallet_id: row for row, wallet_id in enumerate(wallet_ids)}
+    positions = [position for position in positions if position[0] in rows]
+    wallet_indexes = np.fromiter(
+        (rows[wallet_id] for wallet_id, _, _ in positions), dtype=np.intp
+    )
+    codes = category_codes(category for _, category, _ in positions)
+    balances_usd = np.fromiter(
+        (balance_usd or 0 for _, _, balance_usd in positions), dtype=float
+    )
+    values, _ = category_values(wallet_indexes, codes, balances_usd, len(rows))
+    return values
+
+
+def distribution(snapshot):
+    """
+    Category distribution of one wallet snapshot (see `WalletToken.snapshot`),
+    as {category: percentage} for the categories it holds
+    """
+    codes = category_codes(token.get("token__category") for token in snapshot)
+    balances_usd = np.fromiter(
+        (token["balance_usd"] for token in snapshot), dtype=float
+    )
+    values, counts = category_values(
+        np.zeros(len(codes), dtype=np.intp), codes, balances_usd, 1
+    )
+    if values.sum() == 0:
+        return {}
+    percentages = np.round(distributions(values)[0], 2)
+    return {
+        CATEGORIES[code]: float(percentages[code]) for code in np.flatnonzero(counts[0])
+    }
+
+
+def position_deltas(previous, current):
+    """
+    Diffs two wallet snapshots by token address.
+    Returns (bought, sold): lists of (token_data, amount, usd_value, movement_type)
+    where movement_type is new_position / increased_position for bought tokens
+    and closed_position / decreased_position for sold ones.
+    """
+    previous_by_address = {token["token__address"]: token for token in previous}
+    current_by_address = {token["token__address"]: token for token in current}
+    addresses = list(current_by_address) + [
+        address for address in previous_by_address if address not in current_by_address
+    ]
+
+    def column(tokens, field):
+        return np.array(
+            [(tokens.get(address) or {}).get(field, 0) for address in addresses],
+            dtype=float,
+        )
+
+    held_before = np.array([a in previous_by_address for a in addresses])
+    held_now = np.array([a in current_by_address for a in addresses])
+    balance_before = column(previous_by_address, "balance")
+    balance_now = column(current_by_address, "balance")
+    usd_before = column(previous_by_address, "balance_usd")
+    usd_now = column(current_by_address, "balance_usd")
+    balance_change = balance_now - balance_before
+    usd_change = usd_now - usd_before
+
+    bought = []
+    for i in np.flatnonzero(held_now & (~held_before | (balance_change > 0))):
+        token = current_by_address[addresses[i]]
+        if held_before[i]:
+            bought.append(
+                (
+                    token,
+                    float(balance_change[i]),
+                    float(usd_change[i]),
+                    "increased_position",
+                )
+            )
+        else:
+            bought.append(
+                (token, float(balance_now[i]), float(usd_now[i]), "new_position")
+            )
+
+    sold = []
+    for i in np.flatnonzero(held_before & (~held_now | (balance_change < 0))):
+        token = previous_by_address[addresses[i]]
+        if held_now[i]:
+            sold.append(
+                (
+                    token,
+                    float(-balance_change[i]),
+                    float(-usd_change[i]),
+                    "decreased_position",
+                )
+            )
+        else:
+            sold.append(
+                (
+                    token,
+                    float(balance_before[i]),
+                    float(usd_before[i]),
+                    "closed_position",
+                )
+            )
+
+    return bought, sold
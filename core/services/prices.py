@@ -0,0 +1,297 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from decouple import config
+from django.core.cache import cache
+from django.db import connection
+
+from core.services.http import (
+    JSON_HEADERS,
+    alchemy_prices_url,
+    arequest,
+    closing_clients,
+)
+from core.utils import normalize_address
+
+# CoinGecko asset platform -> Alchemy network, for the Alchemy fallback
+ALCHEMY_NETWORKS = {
+    "ethereum": "eth-mainnet",
+    "base": "base-mainnet",
+}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+async def _coingecko_token_prices(network, addresses):
+    url = "{coingecko_endpoint}/simple/token_price/{network}".format(
+        coingecko_endpoint=config("COINGECKO_API_URL"), network=network
+    )
+    print(
+        "Getting CoinGecko prices for {} tokens on network `{}`...".format(
+            len(addresses), network
+        )
+    )
+    response = await arequest(
+        "GET",
+        url,
+        provider="coingecko",
+        params={"contract_addresses": ",".join(addresses), "vs_currencies": "usd"},
+        headers={"accept": "application/json"},
+    )
+    if response.status_code != 200:
+        print("Error getting token prices from CoinGecko: {}".format(response.text))
+        return {}
+    return {
+        normalize_address(address): data.get("usd")
+        for address, data in response.json().items()
+        if data.get("usd") is not None
+    }
+
+
+async def _coingecko_coin_prices(coin_ids):
+    url = "{coingecko_endpoint}/simple/price".format(
+        coingecko_endpoint=config("COINGECKO_API_URL")
+    )
+    print("Getting CoinGecko prices for coins {}...".format(coin_ids))
+    response = await arequest(
+        "GET",
+        url,
+        provider="coingecko",
+        params={"ids": ",".join(coin_ids), "vs_currencies": "usd"},
+        headers={"accept": "application/json"},
+    )
+    if response.status_code != 200:
+        print("Error getting coin prices from CoinGecko: {}".format(response.text))
+        return {}
+    return {
+        coin_id: data.get("usd")
+        for coin_id, data in response.json().items()
+        if data.get("usd") is not None
+    }
+
+
+async def _alchemy_token_prices(network, addresses):
+    alchemy_network = ALCHEMY_NETWORKS.get(network)
+    if alchemy_network is None:
+        return {}
+
+    print(
+        "Getting Alchemy prices for {} tokens on network `{}`...".format(
+            len(addresses), alchemy_network
+        )
+    )
+    response = await arequest(
+        "POST",
+        alchemy_prices_url(),
+        provider="alchemy",
+        json={
+            "addresses": [
+                {"network": alchemy_network, "address": address}
+                for address in addresses
+            ]
+        },
+        headers=JSON_HEADERS,
+    )
+    prices = {}
+    for entry in response.json().get("data", []):
+        usd_prices = [
+            price
+            for price in entry.get("prices") or []
+            if price.get("currency") == "usd"
+        ]
+        if entry.get("error") is None and usd_prices:
+            prices[normalize_address(entry.get("address"))] = float(
+                usd_prices[0].get("value")
+            )
+    return prices
+
+
+async def _safe(coroutine, provider):
+    try:
+        return await coroutine
+    except Exception as e:
+        print("Error getting prices from {}: {}".format(provider, e))
+        return {}
+
+
+async def _afetch_token_prices(token_keys, coin_ids):
+    """
+    Network path of `aget_token_prices`.
+    Contracts are queried on CoinGecko in chunks of COINGECKO_PRICE_BATCH_SIZE;
+    the ones CoinGecko does not price are retried on the Alchemy prices API in
+    chunks of ALCHEMY_PRICE_BATCH_SIZE.
+    """
+    coingecko_batch_size = config("COINGECKO_PRICE_BATCH_SIZE", default=100, cast=int)
+    alchemy_batch_size = config("ALCHEMY_PRICE_BATCH_SIZE", default=25, cast=int)
+
+    addresses_by_network = {}
+    for network, address in token_keys:
+        addresses_by_network.setdefault(network, set()).add(normalize_address(address))
+
+    batches = [
+        (network, chunk)
+        for network, addresses in addresses_by_network.items()
+        for chunk in _chunks(sorted(addresses), coingecko_batch_size)
+    ]
+    coin_ids = sorted(set(coin_ids))
+    results = await asyncio.gather(
+        *[
+            _safe(_coingecko_token_prices(network, chunk), "CoinGecko")
+            for network, chunk in batches
+        ],
+        *[
+            _safe(_coingecko_coin_prices(chunk), "CoinGecko")
+            for chunk in _chunks(coin_ids, coingecko_batch_size)
+        ],
+    )
+
+    token_prices = {}
+    for (network, _), prices in zip(batches, results[: len(batches)]):
+        for address, price in prices.items():
+            token_prices[(network, address)] = price
+    coin_prices = {}
+    for prices in results[len(batches) :]:
+        coin_prices.update(prices)
+
+    # Fall back to Alchemy for the contracts CoinGecko did not price
+    fallback_batches = [
+        (network, chunk)
+        for network, addresses in addresses_by_network.items()
+        for chunk in _chunks(
+            sorted(a for a in addresses if (network, a) not in token_prices),
+            alchemy_batch_size,
+        )
+    ]
+    fallback_results = await asyncio.gather(
+        *[
+            _safe(_alchemy_token_prices(network, chunk), "Alchemy")
+            for network, chunk in fallback_batches
+        ]
+    )
+    for (network, _), prices in zip(fallback_batches, fallback_results):
+        for address, price in prices.items():
+            token_prices[(network, address)] = price
+
+    return token_prices, coin_prices
+
+
+def _token_cache_key(network, address):
+    return "price:{}:{}".format(network, address)
+
+
+def _coin_cache_key(coin_id):
+    return "price:coin:{}".format(coin_id)
+
+
+async def _acache_prices(token_prices, coin_prices):
+    fresh_ttl = config("PRICE_CACHE_TTL_SECONDS", default=60, cast=int)
+    stale_ttl = config("PRICE_CACHE_STALE_SECONDS", default=600, cast=int)
+    fetched_at = time.time()
+    entries = {
+        _token_cache_key(network, address): (price, fetched_at)
+        for (network, address), price in token_prices.items()
+    }
+    entries.update(
+        {
+            _coin_cache_key(coin_id): (price, fetched_at)
+            for coin_id, price in coin_prices.items()
+        }
+    )
+    if entries:
+        await cache.aset_many(entries, timeout=fresh_ttl + stale_ttl)
+
+
+async def _arefresh_prices(token_keys, coin_ids):
+    token_prices, coin_prices = await _afetch_token_prices(token_keys, coin_ids)
+    await _acache_prices(token_prices, coin_prices)
+    return token_prices, coin_prices
+
+
+def _revalidate_in_background(token_keys, coin_ids):
+    """
+    Refreshes stale prices off the request path. A short-lived cache lock makes
+    sure only one worker refreshes a given batch at a time.
+    """
+
+    def acquire(cache_key):
+        return cache.add("refresh:{}".format(cache_key), True, timeout=30)
+
+    token_keys = [key for key in token_keys if acquire(_token_cache_key(*key))]
+    coin_ids = [coin_id for coin_id in coin_ids if acquire(_coin_cache_key(coin_id))]
+    if not token_keys and not coin_ids:
+        return
+
+    def refresh():
+        try:
+            async_to_sync(closing_clients(_arefresh_prices))(token_keys, coin_ids)
+        except Exception as e:
+            print("Error revalidating prices: {}".format(e))
+        finally:
+            # The rate limiter may have opened a connection in this thread
+            connection.close()
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+async def aget_token_prices(token_keys, coin_ids=()):
+    """
+    Prices many tokens (one wallet, or many wallets at once) with a handful of
+    batched requests.
+    `token_keys` is an iterable of (coingecko_network, contract_address) and
+    `coin_ids` of CoinGecko coin ids (for native assets).
+    Prices are read from the shared Django cache first. Entries younger than
+    PRICE_CACHE_TTL_SECONDS are used as is; older ones (up to
+    PRICE_CACHE_STALE_SECONDS more) are used while being refreshed in the
+    background; only misses go to the network.
+    Returns (token_prices, coin_prices): {(network, address): usd} and
+    {coin_id: usd}. Tokens without a price are left out.
+    """
+    fresh_ttl = config("PRICE_CACHE_TTL_SECONDS", default=60, cast=int)
+    token_keys = {
+        (network, normalize_address(address)) for network, address in token_keys
+    }
+    coin_ids = set(coin_ids)
+
+    keys = {_token_cache_key(*key): ("token", key) for key in token_keys}
+    keys.update({_coin_cache_key(coin_id): ("coin", coin_id) for coin_id in coin_ids})
+    cached = await cache.aget_many(list(keys.keys()))
+
+    now = time.time()
+    token_prices, coin_prices = {}, {}
+    stale_tokens, stale_coins = [], []
+    for cache_key, (price, fetched_at) in cached.items():
+        kind, key = keys[cache_key]
+        if kind == "token":
+            token_prices[key] = price
+            if now - fetched_at > fresh_ttl:
+                stale_tokens.append(key)
+        else:
+            coin_prices[key] = price
+            if now - fetched_at > fresh_ttl:
+                stale_coins.append(key)
+
+    if stale_tokens or stale_coins:
+        _revalidate_in_background(stale_tokens, stale_coins)
+
+    missing_tokens = [key for key in token_keys if key not in token_prices]
+    missing_coins = [coin_id for coin_id in coin_ids if coin_id not in coin_prices]
+    if missing_tokens or missing_coins:
+        fetched_tokens, fetched_coins = await _arefresh_prices(
+            missing_tokens, missing_coins
+        )
+        token_prices.update(fetched_tokens)
+        coin_prices.update(fetched_coins)
+
+    return token_prices, coin_prices
+
+
+def get_token_prices(token_keys, coin_ids=()):
+    """
+    Sync counterpart of `aget_token_prices`
+    """
+    return async_to_sync(aget_token_prices)(list(token_keys), list(coin_ids))
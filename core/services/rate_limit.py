@@ -0,0 +1,104 @@
+import asyncio
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models.rate_limit import RateLimitBucket
+
+# Requests per minute allowed by our plans, overridable with
+# `<PROVIDER>_RATE_LIMIT_PER_MINUTE` (0 disables the limiter)
+RATE_LIMIT_DEFAULTS = {
+    "coingecko": 30,
+    "etherscan": 300,
+    "alchemy": 1500,
+    "farcaster": 5,
+    "twitter": 1,
+}
+
+# Database alias the buckets are updated on: a connection of their own, so the
+# bucket row is never locked until the end of a caller's transaction
+RATE_LIMIT_DATABASE = "rate_limit"
+
+
+@lru_cache(maxsize=None)
+def _limits(provider):
+    """
+    Refill rate (tokens per second) and bucket size of `provider`
+    """
+    per_minute = config(
+        "{}_RATE_LIMIT_PER_MINUTE".format(provider.upper()),
+        default=RATE_LIMIT_DEFAULTS.get(provider, 0),
+        cast=float,
+    )
+    burst = config(
+        "{}_RATE_LIMIT_BURST".format(provider.upper()),
+        default=max(1, per_minute // 60),
+        cast=float,
+    )
+    return per_minute / 60, burst
+
+
+def reserve(provider):
+    """
+    Takes a token from the shared bucket of `provider` and returns how long the
+    caller must wait before using it, in seconds (0 when a token was available).
+    """
+    rate, burst = _limits(provider)
+    if not rate:
+        return 0
+
+    now = timezone.now()
+    try:
+        with transaction.atomic(using=RATE_LIMIT_DATABASE):
+            bucket, _ = (
+                RateLimitBucket.objects.using(RATE_LIMIT_DATABASE)
+                .select_for_update()
+                .get_or_create(
+                    provider=provider, defaults={"tokens": burst, "updated_at": now}
+                )
+            )
+            elapsed = max((now - bucket.updated_at).total_seconds(), 0)
+            bucket.tokens = min(burst, bucket.tokens + elapsed * rate) - 1
+            bucket.updated_at = now
+            bucket.save(update_fields=["tokens", "updated_at"])
+    except Exception as e:
+        print("Error reserving a {} rate limit token: {}".format(provider, e))
+        return 0
+
+    wait = max(-bucket.tokens / rate, 0)
+    if bucket.blocked_until is not None:
+        wait = max(wait, (bucket.blocked_until - now).total_seconds())
+    return wait
+
+
+def penalize(provider, seconds):
+    """
+    Stops every process from calling `provider` for `seconds` (e.g. after a 429
+    with a Retry-After header)
+    """
+    until = timezone.now() + timedelta(seconds=seconds)
+    RateLimitBucket.objects.using(RATE_LIMIT_DATABASE).filter(
+        Q(blocked_until__isnull=True) | Q(blocked_until__lt=until), provider=provider
+    ).update(blocked_until=until)
+
+
+def acquire(provider):
+    wait = reserve(provider)
+    if wait > 0:
+        time.sleep(wait)
+
+
+async def aacquire(provider):
+    wait = await sync_to_async(reserve)(provider)
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+async def apenalize(provider, seconds):
+    await sync_to_async(penalize)(provider, seconds)
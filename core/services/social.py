@@ -0,0 +1,56 @@
+from decouple import config
+from farcaster import Warpcast
+import tweepy
+
+_farcaster_client = None
+_twitter_client = None
+
+
+def get_farcaster_client():
+    """
+    Shared authenticated Warpcast client, or None when not configured
+    """
+    global _farcaster_client
+    if _farcaster_client is None and config("FARCASTER_MNEMONIC", default=""):
+        _farcaster_client = Warpcast(mnemonic=config("FARCASTER_MNEMONIC"))
+    return _farcaster_client
+
+
+def get_twitter_client():
+    """
+    Shared authenticated Twitter client, or None when not configured
+    """
+    global _twitter_client
+    if _twitter_client is None and config("TWITTER_CONSUMER_KEY", default=""):
+        _twitter_client = tweepy.Client(
+            consumer_key=config("TWITTER_CONSUMER_KEY"),
+            consumer_secret=config("TWITTER_CONSUMER_SECRET"),
+            access_token=config("TWITTER_ACCESS_TOKEN"),
+            access_token_secret=config("TWITTER_ACCESS_TOKEN_SECRET"),
+            bearer_token=config("TWITTER_BEARER_TOKEN"),
+        )
+    return _twitter_client
+
+
+def social_platform(wallet):
+    """
+    Platform the messages of `wallet` are posted to, or None
+    """
+    if wallet.farcaster_handle and get_farcaster_client():
+        return "farcaster"
+    if wallet.twitter_handle and get_twitter_client():
+        return "twitter"
+    return None
+
+
+def post_message(platform, text):
+    """
+    Posts `text` (blocking) and returns the id of the cast or tweet
+    """
+    if platform == "farcaster":
+        response = get_farcaster_client().post_cast(text=text)
+        return getattr(getattr(response, "cast", None), "hash", None)
+    if platform == "twitter":
+        response = get_twitter_client().create_tweet(text=text)
+        return (response.data or {}).get("id")
+    raise ValueError("Unknown social platform `{}`".format(platform))
@@ -0,0 +1,45 @@
+import re
+
+from decouple import Csv, config
+
+from core.models.token import Token
+from core.utils import normalize_address
+
+# Airdropped spam tokens advertise a site or a "claim" in their name or symbol
+SPAM_TOKEN_NAME_PATTERN = re.compile(
+    config(
+        "SPAM_TOKEN_NAME_PATTERN",
+        default=r"https?://|www\.|t\.me/|\.(com|io|org|net|xyz|vip|app|gift)\b"
+        r"|claim|visit|reward|airdrop|voucher",
+    ),
+    re.IGNORECASE,
+)
+SPAM_TOKEN_ADDRESSES = frozenset(
+    normalize_address(address)
+    for address in config("SPAM_TOKEN_ADDRESSES", default="", cast=Csv())
+)
+
+
+def known_spam_addresses(chain_id, contract_addresses):
+    """
+    The contract addresses flagged as spam, in the database or in
+    SPAM_TOKEN_ADDRESSES
+    """
+    contract_addresses = list(contract_addresses)
+    spam = set(SPAM_TOKEN_ADDRESSES.intersection(contract_addresses))
+    spam.update(
+        Token.objects.filter(
+            chain_id=chain_id, address__in=contract_addresses, is_spam=True
+        ).values_list("address", flat=True)
+    )
+    return spam
+
+
+def looks_like_spam(token_metadata):
+    """
+    Whether the Alchemy metadata of a token looks like an airdrop scam
+    """
+    text = " ".join(
+        filter(None, [token_metadata.get("name"), token_metadata.get("symbol")])
+    )
+    return bool(SPAM_TOKEN_NAME_PATTERN.search(text))
@@ -0,0 +1,134 @@
+import asyncio
+import atexit
+import queue
+import random
+import threading
+import time
+
+from decouple import config
+from nillion_sv_wrappers import SecretVaultWrapper
+
+from core.nillion_config import config as nillion_config
+from core.services.http import BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS
+
+_STOP = object()
+
+
+class VaultWriter:
+    """
+    Process-wide writer of trade summaries to the Nillion SecretVault.
+    `submit` only buffers the record; a background thread writes the buffer to
+    the nodes in batches of up to NILLION_BATCH_SIZE records, at least every
+    NILLION_FLUSH_INTERVAL_SECONDS, retrying failed batches.
+    The initialized `SecretVaultWrapper` is reused across batches and rebuilt
+    every NILLION_VAULT_REFRESH_SECONDS (or after a failure) to renew its
+    credentials. Buffered records are flushed at exit, but lost on a crash.
+    """
+
+    def __init__(self):
+        self.batch_size = config("NILLION_BATCH_SIZE", default=50, cast=int)
+        self.flush_interval = config(
+            "NILLION_FLUSH_INTERVAL_SECONDS", default=5, cast=float
+        )
+        self.refresh_seconds = config(
+            "NILLION_VAULT_REFRESH_SECONDS", default=3000, cast=float
+        )
+        self.max_attempts = config("NILLION_WRITE_MAX_ATTEMPTS", default=5, cast=int)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._vault = None
+        self._vault_created_at = 0
+
+    def submit(self, record):
+        """
+        Buffers a record for the next batch and returns right away
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        self._queue.put(record)
+
+    def close(self, timeout=30):
+        """
+        Flushes the buffered records and stops the background thread
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _next_batch(self):
+        """
+        Blocks for the first record, then collects more until the batch is full
+        or the flush interval elapsed. Returns (batch, stop).
+        """
+        batch = []
+        record = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while record is not _STOP:
+            batch.append(record)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, False
+            try:
+                record = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _run(self):
+        # The wrapper keeps its clients bound to this loop
+        loop = asyncio.new_event_loop()
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if batch:
+                    loop.run_until_complete(self._write(batch))
+        finally:
+            loop.close()
+
+    async def _get_vault(self):
+        if (
+            self._vault is None
+            or time.monotonic() - self._vault_created_at > self.refresh_seconds
+        ):
+            vault = SecretVaultWrapper(
+                nillion_config["nodes"],
+                nillion_config["org_credentials"],
+                config("NILLION_SCHEMA_ID"),
+            )
+            await vault.init()
+            self._vault, self._vault_created_at = vault, time.monotonic()
+        return self._vault
+
+    async def _write(self, batch):
+        for attempt in range(self.max_attempts):
+            try:
+                vault = await self._get_vault()
+                await vault.write_to_nodes(batch)
+                print("Stored {} records in Nillion".format(len(batch)))
+                return
+            except Exception as e:
+                print(
+                    "Error storing {} records in Nillion (attempt {}/{}): {}".format(
+                        len(batch), attempt + 1, self.max_attempts, e
+                    )
+                )
+                # Start over with fresh credentials
+                self._vault = None
+                if attempt + 1 < self.max_attempts:
+                    await asyncio.sleep(
+                        random.uniform(
+                            0,
+                            min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt),
+                        )
+                    )
+        print("Dropping {} records not stored in Nillion".format(len(batch)))
+
+
+vault_writer = VaultWriter()
@@ -1,3 +1,678 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+import os
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import connection, transaction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from core.middleware import AlchemyRequestHandlerMiddleware
+from core.models import PendingWalletSync, RateLimitBucket, Token, Wallet, WalletToken
+from core.pipeline import process_wallet_sync
+from core.services import http, portfolio, rate_limit
+from core.services.generation import (
+    censored_histogram,
+    hedged_generate,
+    latency_percentile,
+    outcome_counts,
+)
+
+WALLET_ADDRESS = "0x1111111111111111111111111111111111111111"
+TOKEN_ADDRESS = "0x2222222222222222222222222222222222222222"
+SPAM_ADDRESS = "0x4444444444444444444444444444444444444444"
+DUST_ADDRESS = "0x5555555555555555555555555555555555555555"
+
+
+class ProcessWalletSyncTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the post_save signal, which calls Alchemy
+        (self.wallet,) = Wallet.objects.bulk_create(
+            [Wallet(address=WALLET_ADDRESS, last_full_sync_at=timezone.now())]
+        )
+        self.token = Token.objects.create(
+            address=TOKEN_ADDRESS,
+            chain_id=self.wallet.chain_id,
+            decimals=18,
+            symbol="TKN",
+            name="Token",
+            category="ALTS",
+            market_data={"current_price_usd": 2.0},
+        )
+        WalletToken.objects.create(
+            wallet=self.wallet,
+            token=self.token,
+            balance=1,
+            balance_usd=2,
+            raw_balance=10**18,
+        )
+        self.pending = PendingWalletSync.objects.create(
+            wallet=self.wallet,
+            activities=[
+                {
+                    "from_address": "0x3333333333333333333333333333333333333333",
+                    "to_address": WALLET_ADDRESS,
+                    "asset": "TKN",
+                    "contract_address": TOKEN_ADDRESS,
+                    "decimals": 18,
+                    "value": 1,
+                    "raw_value": hex(10**18),
+                    "hash": "0xabc",
+                    "log_index": "0x1",
+                    "block_num": "0x10",
+                }
+            ],
+            event_ids=["whevt_test"],
+            due_at=timezone.now() - timedelta(seconds=1),
+        )
+
+    def _patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _patch_upstreams(self):
+        self._patch("core.models.wallet.get_token_prices", return_value=({}, {}))
+        self._patch("core.models.wallet.get_native_balance_alchemy", return_value=0)
+        self.vault_writer = self._patch("core.pipeline.vault_writer")
+        self._patch("core.pipeline.social_platform", return_value=None)
+        return self._patch("core.pipeline.hedged_generate", new=mock.AsyncMock())
+
+    def test_retried_window_applies_the_deltas_once(self):
+        generate = self._patch_upstreams()
+        generate.side_effect = [Exception("timeout"), "Nice trade"]
+
+        with self.assertRaises(Exception):
+            async_to_sync(process_wallet_sync)(self.pending.pk)
+        self.assertEqual(
+            WalletToken.objects.get(token=self.token).raw_balance, 2 * 10**18
+        )
+        self.assertIsNone(Wallet.objects.get(pk=self.wallet.pk).latest_trade_summary)
+        self.vault_writer.submit.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(
+                async_to_sync(process_wallet_sync)(self.pending.pk), "COMPLETED"
+            )
+        self.vault_writer.submit.assert_called_once()
+        self.assertEqual(
+            WalletToken.objects.get(token=self.token).raw_balance, 2 * 10**18
+        )
+        self.assertFalse(PendingWalletSync.objects.filter(pk=self.pending.pk).exists())
+
+    def test_activities_covered_by_the_last_full_sync_are_skipped(self):
+        Wallet.objects.filter(pk=self.wallet.pk).update(balances_block=0x10)
+        self._patch_upstreams().return_value = "Nice trade"
+
+        async_to_sync(process_wallet_sync)(self.pending.pk)
+
+        self.assertEqual(WalletToken.objects.get(token=self.token).raw_balance, 10**18)
+
+    def test_balances_are_read_before_the_wallet_is_locked(self):
+        self._patch_upstreams().return_value = "Nice trade"
+        depths = []
+        self._patch(
+            "core.models.wallet.get_native_balance_alchemy",
+            side_effect=lambda *args: depths.append(len(connection.atomic_blocks)) or 0,
+        )
+        depth = len(connection.atomic_blocks)
+
+        async_to_sync(process_wallet_sync)(self.pending.pk)
+
+        self.assertEqual(depths, [depth])
+        self.assertEqual(
+            WalletToken.objects.get(token=self.token).raw_balance, 2 * 10**18
+        )
+
+    def test_spam_and_dust_airdrops_are_dropped_without_a_full_sync(self):
+        self._patch_upstreams().return_value = "Nice trade"
+        self._patch(
+            "core.models.wallet.get_token_prices",
+            return_value=({("base", DUST_ADDRESS): 0.001}, {}),
+        )
+        self._patch(
+            "core.models.wallet.aget_tokens_metadata_alchemy",
+            new=mock.AsyncMock(
+                return_value={
+                    SPAM_ADDRESS: {"name": "Visit claim-reward.com", "decimals": 0},
+                    DUST_ADDRESS: {"name": "Dust", "decimals": 18},
+                }
+            ),
+        )
+        full_sync = self._patch("core.models.wallet.get_wallet_balances_alchemy")
+        self.pending.activities += [
+            dict(
+                self.pending.activities[0],
+                contract_address=contract_address,
+                raw_value=hex(raw_value),
+                decimals=decimals,
+                log_index=log_index,
+            )
+            for contract_address, raw_value, decimals, log_index in (
+                (SPAM_ADDRESS, 1000, 0, "0x2"),
+                (DUST_ADDRESS, 10**18, 18, "0x3"),
+            )
+        ]
+        self.pending.save()
+
+        async_to_sync(process_wallet_sync)(self.pending.pk)
+
+        full_sync.assert_not_called()
+        self.assertEqual(
+            list(WalletToken.objects.values_list("token__address", flat=True)),
+            [TOKEN_ADDRESS],
+        )
+        # Later airdrops of the spam contract are dropped before any lookup
+        self.assertTrue(Token.objects.get(address=SPAM_ADDRESS).is_spam)
+
+    def test_raw_balances_are_stored_exactly(self):
+        raw_balance = 123456789012345678901234
+        WalletToken.objects.filter(token=self.token).update(raw_balance=raw_balance)
+
+        self.assertEqual(
+            WalletToken.objects.get(token=self.token).raw_balance, raw_balance
+        )
+
+    def test_claim_due_takes_one_window_per_wallet(self):
+        PendingWalletSync.objects.create(wallet=self.wallet, due_at=timezone.now())
+
+        self.assertEqual(
+            PendingWalletSync.claim_due(limit=10, lease_seconds=60, max_attempts=5),
+            [self.pending.pk],
+        )
+        # The wallet has a window in flight until the lease expires
+        self.assertEqual(
+            PendingWalletSync.claim_due(limit=10, lease_seconds=60, max_attempts=5),
+            [],
+        )
+
+    def _patch_full_sync(self, **kwargs):
+        self._patch(
+            "core.models.wallet.aget_token_prices",
+            new=mock.AsyncMock(return_value=({}, {})),
+        )
+        self._patch(
+            "core.models.wallet.aget_tokens_metadata_alchemy",
+            new=mock.AsyncMock(return_value={}),
+        )
+        self._patch(
+            "core.models.wallet.acheck_coingecko_by_contract",
+            new=mock.AsyncMock(side_effect=Exception("timeout")),
+        )
+        return self._patch("core.models.wallet.get_wallet_balances_alchemy", **kwargs)
+
+    def test_full_sync_keeps_positions_it_could_not_price(self):
+        self._patch_full_sync(
+            return_value=(
+                0x20,
+                0,
+                iter([{"contractAddress": TOKEN_ADDRESS, "tokenBalance": hex(10**18)}]),
+            ),
+        )
+
+        self.assertTrue(self.wallet.sync_wallet())
+
+        wallet_token = WalletToken.objects.get(token=self.token)
+        self.assertEqual(wallet_token.raw_balance, 10**18)
+        self.assertEqual(wallet_token.balance_usd, 2)
+
+    def test_full_sync_reads_again_when_the_balances_change_meanwhile(self):
+        def read_balances(network, address):
+            if get_balances.call_count == 1:
+                # A window applies its deltas while the balances are read
+                WalletToken.objects.filter(token=self.token).update(
+                    raw_balance=2 * 10**18
+                )
+            return (
+                0x20,
+                0,
+                iter([{"contractAddress": TOKEN_ADDRESS, "tokenBalance": hex(10**18)}]),
+            )
+
+        get_balances = self._patch_full_sync(side_effect=read_balances)
+
+        self.assertTrue(self.wallet.sync_wallet())
+
+        self.assertEqual(get_balances.call_count, 2)
+        self.assertEqual(Wallet.objects.get(pk=self.wallet.pk).balances_block, 0x20)
+
+    def test_window_is_marked_failed_after_the_max_attempts(self):
+        for _ in range(2):
+            (pk,) = PendingWalletSync.claim_due(
+                limit=10, lease_seconds=60, max_attempts=2
+            )
+            pending = PendingWalletSync.objects.get(pk=pk)
+            pending.mark_failed(Exception("timeout"), 0, max_attempts=2)
+
+        pending.refresh_from_db()
+        self.assertTrue(pending.failed)
+        self.assertEqual(pending.last_error, "timeout")
+        self.assertEqual(
+            PendingWalletSync.claim_due(limit=10, lease_seconds=60, max_attempts=5),
+            [],
+        )
+
+
+class ProcessWebhookEventsTests(TransactionTestCase):
+    def test_once_waits_for_open_windows(self):
+        (wallet,) = Wallet.objects.bulk_create([Wallet(address=WALLET_ADDRESS)])
+        pending = PendingWalletSync.objects.create(
+            wallet=wallet, due_at=timezone.now() + timedelta(seconds=0.2)
+        )
+
+        with mock.patch(
+            "core.management.commands.process_webhook_events.process_wallet_sync",
+            new=mock.AsyncMock(return_value="COMPLETED"),
+        ) as process:
+            call_command("process_webhook_events", once=True, stdout=io.StringIO())
+
+        process.assert_awaited_once_with(pending.pk)
+
+
+class RateLimitTests(TransactionTestCase):
+    databases = {"default", rate_limit.RATE_LIMIT_DATABASE}
+
+    def setUp(self):
+        # 1 token per second, bursts of 2
+        patcher = mock.patch.object(rate_limit, "_limits", return_value=(1.0, 2.0))
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def test_reserve_does_not_join_the_callers_transaction(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                rate_limit.reserve("alchemy")
+                raise ValueError
+
+        # The token was committed on its own connection
+        self.assertEqual(RateLimitBucket.objects.get(provider="alchemy").tokens, 1)
+
+    def _reserve_at(self, seconds):
+        with mock.patch("core.services.rate_limit.timezone") as clock:
+            clock.now.return_value = self.start + timedelta(seconds=seconds)
+            return rate_limit.reserve("alchemy")
+
+    def test_bucket_refills_at_the_rate_up_to_the_burst(self):
+        self.start = timezone.now()
+
+        self.assertEqual(self._reserve_at(0), 0)
+        self.assertEqual(self._reserve_at(0), 0)
+        # Empty bucket: the third caller waits for the next token
+        self.assertEqual(self._reserve_at(0), 1)
+        # 10s refill 10 tokens, capped at the burst of 2
+        self.assertEqual(self._reserve_at(10), 0)
+        self.assertEqual(self._reserve_at(10), 0)
+        self.assertEqual(self._reserve_at(10), 1)
+
+    def test_penalize_blocks_every_caller_until_the_deadline(self):
+        self.start = timezone.now()
+        self._reserve_at(0)
+
+        with mock.patch("core.services.rate_limit.timezone") as clock:
+            clock.now.return_value = self.start
+            rate_limit.penalize("alchemy", 30)
+
+        self.assertEqual(self._reserve_at(10), 20)
+        self.assertEqual(self._reserve_at(30), 0)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class HedgedGenerateTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def _backend(answer, delay):
+        async def generate():
+            await asyncio.sleep(delay)
+            return answer
+
+        return generate
+
+    async def test_hedge_wins_and_the_cancelled_primary_is_a_censored_sample(self):
+        message = await hedged_generate(
+            [
+                ("autonome", self._backend("slow", 10)),
+                ("openai", self._backend("fast", 0)),
+            ],
+            hedge_delay=0.05,
+            deadline=5,
+        )
+
+        self.assertEqual(message, "fast")
+        self.assertEqual(outcome_counts("autonome")["cancelled"], 1)
+        self.assertEqual(outcome_counts("openai")["success"], 1)
+        self.assertEqual(censored_histogram("autonome")[0.5], 1)
+
+    async def test_timeout_records_every_running_call(self):
+        message = await hedged_generate(
+            [
+                ("autonome", self._backend("slow", 10)),
+                ("openai", self._backend("slow", 10)),
+            ],
+            hedge_delay=0.05,
+            deadline=0.1,
+        )
+
+        self.assertIsNone(message)
+        for backend in ("autonome", "openai"):
+            self.assertEqual(outcome_counts(backend)["timeout"], 1)
+            self.assertEqual(censored_histogram(backend)[0.5], 1)
+
+    async def test_unanswered_calls_raise_the_percentile(self):
+        for _ in range(18):
+            await hedged_generate(
+                [("autonome", self._backend("ok", 0))], hedge_delay=1, deadline=1
+            )
+        for _ in range(2):
+            await hedged_generate(
+                [("autonome", self._backend("slow", 10))], hedge_delay=1, deadline=0.01
+            )
+
+        self.assertEqual(latency_percentile("autonome", 50), 0.5)
+        # Only 18 of 20 calls are known to be that fast
+        self.assertEqual(latency_percentile("autonome", 95), float("inf"))
+
+
+class AlchemyRequestHandlerMiddlewareTests(SimpleTestCase):
+    signing_key = "test-signing-key"
+    body = json.dumps({"webhookId": "wh_1", "id": "whevt_1"}).encode()
+
+    def setUp(self):
+        patcher = mock.patch.dict(
+            os.environ,
+            {
+                "ALCHEMY_WEBHOOK_SIGNING_KEY": self.signing_key,
+                "ALCHEMY_WEBHOOK_PATH": "/api/v1/webhook/",
+            },
+        )
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.factory = RequestFactory()
+        self.middleware = AlchemyRequestHandlerMiddleware(
+            lambda request: HttpResponse("ok")
+        )
+
+    def _sign(self, body):
+        return hmac.new(
+            self.signing_key.encode(), msg=body, digestmod=hashlib.sha256
+        ).hexdigest()
+
+    def _request(self, body, path="/api/v1/webhook/", signature=None):
+        headers = {} if signature is None else {"x-alchemy-signature": signature}
+        return self.factory.post(
+            path, data=body, content_type="application/json", headers=headers
+        )
+
+    def test_valid_signature_attaches_the_event(self):
+        request = self._request(self.body, signature=self._sign(self.body))
+
+        self.assertEqual(self.middleware(request).content, b"ok")
+        self.assertEqual(request.alchemy_webhook_event.id, "whevt_1")
+
+    def test_event_is_parsed_only_when_read(self):
+        body = b"not json"
+        request = self._request(body, signature=self._sign(body))
+
+        self.middleware(request)
+
+        with self.assertRaises(json.JSONDecodeError):
+            request.alchemy_webhook_event.id
+
+    def test_tampered_body_is_rejected(self):
+        request = self._request(self.body + b" ", signature=self._sign(self.body))
+
+        with self.assertRaises(PermissionDenied):
+            self.middleware(request)
+
+    def test_missing_signature_is_rejected(self):
+        with self.assertRaises(PermissionDenied):
+            self.middleware(self._request(self.body))
+
+    def test_paths_under_the_webhook_path_are_checked(self):
+        with self.assertRaises(PermissionDenied):
+            self.middleware(self._request(self.body, path="/api/v1/webhook/other/"))
+
+    def test_other_paths_go_straight_through(self):
+        request = self._request(self.body, path="/api/v1/wallets/")
+
+        self.assertEqual(self.middleware(request).content, b"ok")
+        self.assertFalse(hasattr(request, "alchemy_webhook_event"))
+
+    async def test_async_chain(self):
+        async def get_response(request):
+            return HttpResponse("ok")
+
+        middleware = AlchemyRequestHandlerMiddleware(get_response)
+
+        request = self._request(self.body, signature=self._sign(self.body))
+        response = await middleware(request)
+        self.assertEqual(response.content, b"ok")
+        self.assertEqual(request.alchemy_webhook_event.webhook_id, "wh_1")
+
+        with self.assertRaises(PermissionDenied):
+            await middleware(self._request(self.body, signature=self._sign(b"{}")))
+
+
+class RetryingRequestTests(SimpleTestCase):
+    def setUp(self):
+        for name in ("acquire", "penalize", "aacquire", "apenalize"):
+            patcher = mock.patch.object(rate_limit, name)
+            self.addCleanup(patcher.stop)
+            setattr(self, name, patcher.start())
+
+    @staticmethod
+    def _response(status_code, headers=None):
+        return mock.Mock(status_code=status_code, headers=headers or {})
+
+    def _patch_session(self, *responses):
+        session = mock.Mock()
+        session.request.side_effect = responses
+        patcher = mock.patch.object(http, "get_session", return_value=session)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        return session
+
+    @mock.patch("core.services.http.time.sleep")
+    def test_429_is_retried_after_the_retry_after_delay(self, sleep):
+        session = self._patch_session(
+            self._response(429, {"retry-after": "5"}), self._response(200)
+        )
+
+        response = http.request("GET", "http://example.com", provider="coingecko")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.request.call_count, 2)
+        (delay,), _ = sleep.call_args
+        # Retry-After plus up to a second of jitter
+        self.assertTrue(5 <= delay <= 6)
+        self.penalize.assert_called_once_with("coingecko", delay)
+        self.assertEqual(self.acquire.call_count, 2)
+
+    @mock.patch("core.services.http.time.sleep")
+    def test_503_is_retried_without_penalizing_the_provider(self, sleep):
+        session = self._patch_session(self._response(503), self._response(200))
+
+        response = http.request("GET", "http://example.com", provider="coingecko")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.request.call_count, 2)
+        self.penalize.assert_not_called()
+
+    @mock.patch("core.services.http.time.sleep")
+    def test_other_4xx_are_not_retried(self, sleep):
+        session = self._patch_session(self._response(404), self._response(200))
+
+        response = http.request("GET", "http://example.com", provider="coingecko")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(session.request.call_count, 1)
+        sleep.assert_not_called()
+
+    @mock.patch("core.services.http.time.sleep")
+    def test_gives_up_after_the_max_retries(self, sleep):
+        session = self._patch_session(*[self._response(503)] * (http.MAX_RETRIES + 1))
+
+        response = http.request("GET", "http://example.com", provider="coingecko")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(session.request.call_count, http.MAX_RETRIES + 1)
+
+    async def test_async_429_is_retried_after_the_retry_after_delay(self):
+        client = mock.Mock()
+        client.request = mock.AsyncMock(
+            side_effect=[
+                self._response(429, {"retry-after": "5"}),
+                self._response(404),
+            ]
+        )
+        with mock.patch.object(
+            http, "get_async_client", return_value=client
+        ), mock.patch("core.services.http.asyncio.sleep") as sleep:
+            response = await http.arequest(
+                "GET", "http://example.com", provider="coingecko"
+            )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(client.request.await_count, 2)
+        (delay,), _ = sleep.call_args
+        self.assertTrue(5 <= delay <= 6)
+        self.apenalize.assert_awaited_once_with("coingecko", delay)
+
+
+def _reference_distribution(wallet_tokens):
+    # The dict loop the pipeline used before the NumPy engine. It reset the total
+    # of a category on each of its tokens (the key was checked before being
+    # lowercased); that bug is fixed here.
+    total_value_usd = sum(token["balance_usd"] for token in wallet_tokens)
+    if total_value_usd == 0:
+        return {}
+
+    distribution = {}
+    for token in wallet_tokens:
+        category = (token.get("token__category") or "unknown").lower()
+        distribution.setdefault(category, 0)
+        distribution[category] += (token["balance_usd"] / total_value_usd) * 100
+
+    return {k: round(v, 2) for k, v in distribution.items()}
+
+
+def _reference_position_deltas(previous_wallet_tokens, current_wallet_tokens):
+    previous_tokens = {t["token__address"]: t for t in previous_wallet_tokens}
+    current_tokens = {t["token__address"]: t for t in current_wallet_tokens}
+
+    bought = []
+    for addr, current in current_tokens.items():
+        if addr not in previous_tokens:
+            bought.append(
+                (current, current["balance"], current["balance_usd"], "new_position")
+            )
+        elif current["balance"] > previous_tokens[addr]["balance"]:
+            bought.append(
+                (
+                    current,
+                    current["balance"] - previous_tokens[addr]["balance"],
+                    current["balance_usd"] - previous_tokens[addr]["balance_usd"],
+                    "increased_position",
+                )
+            )
+
+    sold = []
+    for addr, previous in previous_tokens.items():
+        if addr not in current_tokens:
+            sold.append(
+                (
+                    previous,
+                    previous["balance"],
+                    previous["balance_usd"],
+                    "closed_position",
+                )
+            )
+        elif current_tokens[addr]["balance"] < previous["balance"]:
+            sold.append(
+                (
+                    previous,
+                    previous["balance"] - current_tokens[addr]["balance"],
+                    previous["balance_usd"] - current_tokens[addr]["balance_usd"],
+                    "decreased_position",
+                )
+            )
+    return bought, sold
+
+
+def _position(address, category, balance, balance_usd):
+    return {
+        "token__address": address,
+        "token__category": category,
+        "balance": balance,
+        "balance_usd": balance_usd,
+    }
+
+
+class PortfolioEngineTests(SimpleTestCase):
+    previous = [
+        _position("0xeth", "MAJORS", 1.5, 3000.0),
+        _position("0xbtc", "MAJORS", 0.1, 6000.0),
+        _position("0xusdc", "STABLES", 1000.0, 1000.0),
+        _position("0xpepe", "MEMES", 1e9, 12.34),
+        _position("0xnew", None, 10.0, 20.0),
+    ]
+    current = [
+        _position("0xeth", "MAJORS", 2.0, 4000.0),
+        _position("0xbtc", "MAJORS", 0.1, 6000.0),
+        _position("0xusdc", "STABLES", 250.5, 250.5),
+        _position("0xdoge", "MEMES", 3.0, 0.9),
+        _position("0xnew", None, 10.0, 20.0),
+    ]
+
+    def test_distribution_matches_the_dict_loop(self):
+        for snapshot in (self.previous, self.current, [], self.current[:1]):
+            expected = _reference_distribution(snapshot)
+            actual = portfolio.distribution(snapshot)
+            self.assertEqual(set(actual), set(expected))
+            for category, percentage in expected.items():
+                self.assertAlmostEqual(actual[category], percentage, places=2)
+
+    def test_position_deltas_match_the_dict_loop(self):
+        def key(movement):
+            token, amount, usd_value, movement_type = movement
+            return token["token__address"], movement_type, amount, usd_value
+
+        for actual, expected in zip(
+            portfolio.position_deltas(self.previous, self.current),
+            _reference_position_deltas(self.previous, self.current),
+        ):
+            self.assertEqual(sorted(map(key, actual)), sorted(map(key, expected)))
+
+    def test_fleet_values_match_the_per_wallet_dict_loop(self):
+        wallets = {1: self.previous, 2: self.current, 3: []}
+        values = portfolio.fleet_category_values(
+            (
+                (wallet_id, token["token__category"], token["balance_usd"])
+                for wallet_id, snapshot in wallets.items()
+                for token in snapshot
+            ),
+            list(wallets),
+        )
+
+        for row, snapshot in zip(portfolio.distributions(values), wallets.values()):
+            expected = _reference_distribution(snapshot)
+            for code, category in enumerate(portfolio.CATEGORIES):
+                self.assertAlmostEqual(row[code], expected.get(category, 0), places=2)
@@ -0,0 +1,8 @@
+def normalize_address(address):
+    """
+    Returns the canonical (lowercase) form of an EVM address, so lookups can
+    use exact, index-backed matches
+    """
+    if address is None:
+        return None
+    return address.strip().lower()
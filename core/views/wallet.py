@@ -7,10 +7,20 @@ from django.db.models import Q
 from rest_framework.validators import UniqueValidator
 
 from core.models import Wallet
+from core.utils import normalize_address
+
+
+class AddressField(serializers.CharField):
+    """
+    CharField that stores EVM addresses in their canonical lowercase form
+    """
+
+    def to_internal_value(self, data):
+        return normalize_address(super().to_internal_value(data))
 
 
 class WalletSerializer(serializers.ModelSerializer):
-    address = serializers.CharField(
+    address = AddressField(
         max_length=50,
         required=True,
         validators=[UniqueValidator(queryset=Wallet.objects.all())],
@@ -97,7 +107,7 @@ class WalletViewSet(
 
     @action(detail=False, methods=["get"], url_path="address/(?P<address>[^/.]+)")
     def get_by_address(self, request, address=None):
-        wallet = get_object_or_404(Wallet, address=address)
+        wallet = get_object_or_404(Wallet, address=normalize_address(address))
         serializer = self.get_serializer(wallet)
         return Response(serializer.data)
 
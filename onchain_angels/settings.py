@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 import secrets
+import tempfile
 import dj_database_url
 from decouple import config
 
@@ -156,7 +157,9 @@ elif IS_HEROKU_APP or IS_HEROKU_CI:
     DATABASES = {
         "default": dj_database_url.config(
             env="DATABASE_URL",
-            conn_max_age=600,
+            # 0 under ASGI, where each request may run its queries on a different
+            # thread; raise it only with a connection pooler in front
+            conn_max_age=config("DATABASE_CONN_MAX_AGE", default=0, cast=int),
             conn_health_checks=True,
             ssl_require=IS_HEROKU_APP,
         ),
@@ -171,6 +174,44 @@ else:
             "PASSWORD": config("DATABASE_PASSWORD"),
             "HOST": config("DATABASE_HOST", "127.0.0.1"),
             "PORT": config("DATABASE_PORT", "5432"),
+            "CONN_MAX_AGE": config("DATABASE_CONN_MAX_AGE", default=0, cast=int),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+
+# The rate limiter (`core.services.rate_limit`) takes its tokens on a connection
+# of its own, so its short transactions never join a caller's transaction
+DATABASES["rate_limit"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Shared by every worker process (e.g. the token price cache), so the default is
+# file based. Use `CACHE_URL=redis://...` for Redis (or a Redis-compatible server)
+# and `CACHE_URL=locmem://` for a per-process cache.
+
+CACHE_URL = config("CACHE_URL", default="") or "file://{}".format(
+    os.path.join(tempfile.gettempdir(), "onchain_angels_cache")
+)
+
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith("file://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CACHE_URL[len("file://") :],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         }
     }
 